@@ -1,27 +1,64 @@
 import pandas as pd
 import folium
 import streamlit as st
-from streamlit_folium import st_folium
-from streamlit_folium import folium_static
-from folium import plugins
-import json
-from datetime import datetime
+from streamlit_folium import generate_leaflet_string, st_folium
 from keboola_streamlit import KeboolaStreamlit
-import os 
+import time
+import core
+from road_types import build_segments
+from road_enrichment import UNKNOWN, RoadAttributeIndex, enrich_route
+from road_composition import COMPOSITION_COLUMNS, composition_matrix, fleet_composition, route_composition
+from validation import repair_timestamps, valid_timestamp_mask
+from keboola_sync import KeboolaTableSource, TableSync, edited_rows, write_batches
+from route_summary import build_route_summary, group_stops
+from map_layers import (DEFAULT_ROAD_COLOR, ROAD_TYPE_COLORS, ROUTE_COLORS, LiveVehicleUpdate, RenderedMap,
+                        create_geojson_route_map, replay_map, route_map)
+from map_matching import PING_COLUMNS, RouteMatcher, live_route_progress
+from live_feed import FileTailSource, LiveFeed
+from trip_analytics import analyze_pings
+from replay import TrackIndex
+from instrumentation import Metrics
+from geometry import build_lods, lod_level, lod_for_zoom
 
-URL = st.secrets["kbc_url"]
-TOKEN = st.secrets["kbc_token"]
-TABLE_ID = st.secrets["table_id"]
-keboola = KeboolaStreamlit(root_url=URL, token=TOKEN)
 # Set page config
 st.set_page_config(
     page_title="Route Visualization",
     page_icon="🚚",
     layout="wide"
 )
-if 'driver_data' not in st.session_state:
-    with st.spinner("Loading data..."):
-        st.session_state.driver_data = keboola.read_table(TABLE_ID)
+# How long the shared driver table is served before checking Keboola for changes
+DRIVER_DATA_TTL = 300
+def optional_secret(name, default=None):
+    # Settings that have a default also work without a secrets file
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+# Show the performance sidebar with ?debug=1 in the URL or debug_panel set in secrets
+DEBUG_PANEL = st.query_params.get("debug") == "1" or bool(optional_secret("debug_panel", False))
+
+@st.cache_resource
+def get_metrics():
+    # Timings and cache counters collected across all sessions of the server process
+    return Metrics()
+
+metrics = get_metrics()
+
+# Keboola is only contacted by the views that show driver data
+@st.cache_resource
+def get_keboola():
+    return KeboolaStreamlit(root_url=st.secrets["kbc_url"], token=st.secrets["kbc_token"])
+
+@st.cache_resource
+def get_driver_table():
+    # One copy of the driver table per server process, shared by all sessions
+    source = KeboolaTableSource(st.secrets["kbc_url"], st.secrets["kbc_token"], st.secrets["table_id"])
+    return TableSync(source, ttl=DRIVER_DATA_TTL)
+
+def load_driver_data():
+    with st.spinner("Loading data..."), metrics.span('keboola.sync'):
+        return get_driver_table().sync()
 
 # Add custom CSS for better tab styling
 st.markdown("""
@@ -50,231 +87,238 @@ unsafe_allow_html=True
 )
 st.title("Premier Trailer Dashboard")
 
-# Create tabs
-tab1, tab2, tab3 = st.tabs([
-    "_Live_ Status Dashboard", 
-    "Route Details",
-    "Data Quality Check", 
-    
-])
-
-# Add near the top of the file, after imports
-if 'route_progress' not in st.session_state:
-    # Initialize default progress
-    st.session_state.route_progress = {
-        'ROUTE_1': 0.47,  # 33% complete
-        'ROUTE_2': 0.65,  # 40% complete
-        'ROUTE_3': 0.32,  # 50% complete
-        'ROUTE_4': 0.32,  # 25% complete
-        'ROUTE_5': 0.37   # 33% complete
-    }
-with tab1:
-    @st.cache_data
-    def load_data():
-        # Read routes data
-        # Define paths for data files
-        data_dir = os.path.dirname(__file__)
-        routes_path = os.path.join(data_dir, '1routes.csv')
-        routes_df = pd.read_csv(routes_path)
-        
-        # Convert distance from km to miles
-        routes_df['distance'] = routes_df['distance'] * 0.621371
-        
-        # Load GeoJSON data for each route
-        geojson_files = {
-            'ROUTE_1': 'ors__v2_directions_{profile}_get_1738763340945.geojson',
-            'ROUTE_2': 'ors__v2_directions_{profile}_get_1738763410958.geojson', 
-            'ROUTE_3': 'ors__v2_directions_{profile}_get_1738763387823.geojson',
-            'ROUTE_4': 'ors__v2_directions_{profile}_get_1738798617562.geojson',
-            'ROUTE_5': 'ors__v2_directions_{profile}_get_1738798896409.geojson'
+# Only the selected view runs, the others cost nothing on a rerun
+VIEWS = ["_Live_ Status Dashboard", "Route Details", "Data Quality Check", "Replay"]
+# Clicking the selected view again deselects it, that shows the first view too
+view = st.segmented_control("View", VIEWS, default=VIEWS[0], label_visibility="collapsed") or VIEWS[0]
+
+# Number of vehicles offered in the route selector at once
+ROUTE_PAGE_SIZE = 50
+# Above this many routes in view, markers are drawn as batched, clustered layers
+DETAILED_MARKER_LIMIT = 20
+# GPS pings farther than this (meters) from every route are not used for progress
+MAX_SNAP_DISTANCE = 5000
+# How often (seconds) the live map picks up new vehicle positions when a live feed is configured
+LIVE_REFRESH_SECONDS = 5
+# Initial view of the live map
+MAP_CENTER = [37.0902, -85.7129]  # Moved further east from -90.7129
+MAP_ZOOM = 4.5
+# Time between replay frames, and the most frames one replay is built with
+REPLAY_STEPS = {"5 min": 300, "15 min": 900, "1 hour": 3600, "6 hours": 21600}
+MAX_REPLAY_FRAMES = 1000
+
+@metrics.cached('load_data', st.cache_data)
+def load_data():
+    # Read routes data, distance converted for display in miles
+    return core.load_routes()
+
+@metrics.cached('load_route_summary', st.cache_resource)
+def load_route_summary():
+    # Per-route totals and stop lists, computed once so lookups don't scan routes_df
+    routes_df = load_data()
+    summary = build_route_summary(routes_df).to_dict('index')
+    # Routes without rows in the routes table are described by their status row
+    registry = load_registry()
+    for route_id in registry.route_ids:
+        summary.setdefault(route_id, registry.route(route_id))
+    return summary, group_stops(routes_df)
+
+@metrics.cached('load_registry', st.cache_resource)
+def load_registry():
+    # Routes and vehicles come from the status table, geometries are matched by their endpoints
+    return core.load_registry()
+
+@metrics.cached('load_route_index', st.cache_resource)
+def load_route_index(route_id):
+    # Cumulative-distance index, built once per route, geometries are loaded lazily
+    return core.load_route_index(load_registry(), route_id)
+
+@metrics.cached('load_eta_index', st.cache_resource)
+def load_eta_index(route_id):
+    # Cumulative driving time and planned stops, built once per route
+    _, route_stops = load_route_summary()
+    return core.load_eta_index(load_registry(), route_id, load_route_index(route_id), route_stops.get(route_id, []))
+
+@metrics.cached('load_route_lods', st.cache_resource)
+def load_route_lods(route_id):
+    # Simplified geometries per zoom level, computed once per route
+    return build_lods(load_route_index(route_id).latlon)
+
+@metrics.cached('load_route_matcher', st.cache_resource)
+def load_route_matcher(route_id):
+    # Spatial index over one route's segments, only built for routes with a trailer on them
+    return RouteMatcher({route_id: load_route_index(route_id)})
+
+@metrics.cached('load_live_progress', st.cache_data(max_entries=4))
+def load_live_progress(version, _driver_data):
+    # Progress of routes from the latest GPS ping of their own trailer, snapped onto the route.
+    # Empty until the status table assigns trailers to routes (a trailer_id column), the
+    # bundled data only names vehicles
+    if not set(PING_COLUMNS).issubset(_driver_data.columns):
+        return {}
+    return live_route_progress(_driver_data, load_registry().route_for_vehicle, load_route_matcher, MAX_SNAP_DISTANCE)
+
+def route_progress_for(route_id, live_progress):
+    # Fall back to the progress in the vehicle status data when no ping is on the route
+    return live_progress.get(route_id, load_registry().progress(route_id))
+
+@st.cache_resource
+def get_live_feed():
+    # One ingestion thread per server process, tailing the file set as live_feed_path in secrets
+    path = optional_secret("live_feed_path")
+    if not path:
+        return None
+    return LiveFeed(FileTailSource(path)).start()
+
+def live_vehicle_layer(positions, base_map):
+    # Only vehicles that moved since this session's last refresh are sent and their markers are moved
+    # in the browser. A map drawn anew, or possibly remounted by a full rerun, gets every position
+    state = st.session_state.get('live_markers')
+    base = hash(base_map[0])
+    full = state is None or state['base'] != base
+    # -1 predates every update, so everything comes back
+    seq, moved = positions.changes_since(-1 if full else state['seq'])
+    st.session_state.live_markers = {'seq': seq, 'base': base}
+    return folium.FeatureGroup(name="Live Vehicles").add_child(LiveVehicleUpdate(moved, reset=full))
+
+def split_route(route_index, progress, indices=None):
+    # Split by distance travelled, not by vertex count
+    return route_index.split(progress, indices)
+
+def render_map(m):
+    # The script st_folium generates for the map, made once so it can be cached and shown again cheaply
+    m.render()
+    return generate_leaflet_string(m), m.location, m.options['zoom']
+
+def show_map(rendered, key, overlay=None, returned_objects=(), **kwargs):
+    # st_folium adds the overlay to the map it is given, so every call gets a fresh stand-in. The
+    # script, and with it the component, is the same on every rerun, the browser keeps the map
+    # and only swaps the overlay layer. By default nothing is returned, so using the map never reruns.
+    # The view it is shown at is what st_folium reports until the browser sends its own
+    script, location, zoom = rendered
+    shown_at = RenderedMap(script, kwargs.get('center') or location, kwargs.get('zoom') or zoom)
+    return st_folium(shown_at, key=key, feature_group_to_add=overlay, returned_objects=list(returned_objects), **kwargs)
+
+def live_map_routes(route_ids, route_summary, route_stops, live_progress, zoom):
+    # Lines split at each vehicle's progress, simplified for the zoom level, plus what their markers show
+    registry = load_registry()
+    routes = []
+    for route_id in route_ids:
+        route_info = route_summary[route_id]
+        # Get coordinates simplified for the current zoom level
+        route_index = load_route_index(route_id)
+        indices = lod_for_zoom(load_route_lods(route_id), zoom, len(route_index.latlon))
+        # Use progress from live GPS data or the vehicle status data
+        progress = route_progress_for(route_id, live_progress)
+        # Split route into completed and remaining portions
+        completed_route, remaining_route = split_route(route_index, progress, indices)
+        routes.append({
+            'route_id': route_id,
+            'info': route_info,
+            'stops': route_stops.get(route_id, []),
+            'color': ROUTE_COLORS[registry.position(route_id) % len(ROUTE_COLORS)],
+            'progress': progress,
+            'remaining_distance': core.route_status(route_index, load_eta_index(route_id), progress)['remaining_distance'],
+            'completed': completed_route,
+            'remaining': remaining_route
+        })
+    return routes
+
+@metrics.cached('load_live_map', st.cache_resource(max_entries=16))
+def load_live_map(version, route_ids, level, _route_summary, _route_stops, _live_progress):
+    # Routes in view at one detail level, rendered once per version of the driver data and shared
+    # by all sessions. Above the last detail level routes are drawn at full resolution
+    build_started = time.perf_counter()
+    zoom = level if level is not None else float('inf')
+    routes = live_map_routes(route_ids, _route_summary, _route_stops, _live_progress, zoom)
+    # At fleet scale collect markers into a few shared layers instead of one marker each
+    m = route_map(routes, MAP_CENTER, MAP_ZOOM, batched=len(route_ids) > DETAILED_MARKER_LIMIT)
+    rendered = render_map(m)
+    metrics.record('span', 'route_map.build', time.perf_counter() - build_started, routes=len(route_ids))
+    metrics.size('route_map.script', len(rendered[0]), routes=len(route_ids))
+    return rendered
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS if optional_secret("live_feed_path") else None)
+def create_route_map(version, selected_routes, route_summary, route_stops, live_progress):
+    # Keep the current view so switching detail levels doesn't reset the map
+    if 'route_map_view' not in st.session_state:
+        st.session_state.route_map_view = {
+            'center': list(MAP_CENTER),
+            'zoom': MAP_ZOOM
         }
-        
-        geojson_data = {}
-        for route_id, filename in geojson_files.items():
-            geojson_path = os.path.join(data_dir, filename)
-            with open(geojson_path, 'r') as f:
-                geojson_data[route_id] = json.load(f)
-                
-        return routes_df, geojson_data
-
-    def split_route(locations, progress):
-        split_index = int(len(locations) * progress)
-        return locations[:split_index], locations[split_index:]
-
-    @st.fragment
-    def create_route_map(selected_routes, routes_df, geojson_data):
-        # Create a base map centered on central US with closer zoom
-        m = folium.Map(
-            location=[37.0902, -85.7129],  # Moved further east from -90.7129
-            zoom_start=4.5,
-            tiles='cartodbpositron'
-        )
-
-        # Define some colors for different routes
-        colors = ['darkred', 'darkblue', 'darkgreen', 'purple', 'orange']
-
-
-        # Process each selected route
-        for idx, route_id in enumerate(selected_routes):
-            # Get route info
-            route_info = routes_df[routes_df['route_id'] == route_id].iloc[0]
-            
-            # Get coordinates from GeoJSON
-            coordinates = geojson_data[route_id]['features'][0]['geometry']['coordinates']
-            locations = [[coord[1], coord[0]] for coord in coordinates]
-            
-            color = colors[idx % len(colors)]
-            
-            # Use progress from session state
-            progress = st.session_state.route_progress[route_id]
-            
-            # Split route into completed and remaining portions
-            completed_route, remaining_route = split_route(locations, progress)
-            
-            # Draw completed portion of route (darker)
-            folium.PolyLine(
-                locations=completed_route,
-                weight=4,
-                color=color,
-                opacity=0.9
-            ).add_to(m)
-            
-            # Draw remaining portion of route (lighter) only if there are remaining points
-            if remaining_route:
-                plugins.AntPath(
-                    locations=remaining_route,
-                    weight=3,
-                    color=color,
-                    opacity=0.6,
-                    popup=f"Route: {route_id} ({route_info['route_description']})",
-                    delay=1000,
-                    dash_array=[10, 20],
-                    pulse_color='#FFF'
-                ).add_to(m)
-
-            # Add stop markers for this route
-            route_stops = routes_df[
-                (routes_df['route_id'] == route_id) & 
-                (routes_df['stop_type'].isin(['gas', 'sleep', 'break']))
-            ]
-            
-            for _, stop in route_stops.iterrows():
-                # Set icon color and icon type based on stop type
-                if stop['stop_type'] == 'sleep':
-                    icon_color = 'purple'
-                    icon_name = 'bed'
-                elif stop['stop_type'] == 'gas':
-                    icon_color = 'green' 
-                    icon_name = 'gas-station'
-                elif stop['stop_type'] == 'break':
-                    icon_color = 'lightgray'
-                    icon_name = 'cutlery'
-                else:
-                    icon_color = 'lightblue'  # Default color
-                    icon_name = 'glyphicon-info-sign'  # Default icon
-
-                icon = folium.Icon(
-                    icon=icon_name,
-                    prefix='glyphicon',  # Using Bootstrap Glyphicons
-                    color=icon_color,
-                    icon_color='white',  # Use white for the icon color
-                )
-                
-                # Create popup content
-                popup_content = f"""
-                    <b>Stop Type:</b> {stop['stop_type'].title()}<br>
-                    <b>Description:</b> {stop['route_description']}<br>
-                    <b>Duration:</b> {stop['duration']/60:.1f} hours
-                """
-                
-                folium.Marker(
-                    location=[stop['origin_latitude'], stop['origin_longitude']],
-                    tooltip=folium.Tooltip(popup_content, max_width=300),
-                    icon=icon
-                ).add_to(m)
-            
-            # Add vehicle marker at current position (use the last point of the route if 100% complete)
-            vehicle_position = completed_route[-1] if completed_route else locations[0]
-            
-            # Calculate total duration including breaks
-            total_duration = routes_df[routes_df['route_id'] == route_id]['duration'].sum()
-            # Calculate remaining distance and time (ensure they don't go below 0)
-            remaining_distance = max(route_info['distance'] * (1 - progress), 0)
-            remaining_time = max(total_duration * (1 - progress), 0)
-            
-            # Calculate average speed in mph
-            avg_speed = (route_info['distance']/1000) / (route_info['duration']/60)
-            
-            vehicle_icon = folium.DivIcon(
-                html=f'''
-                    <div style="font-family: FontAwesome; color: {color}; background-color: {color}; width: 30px; height: 30px; border-radius: 50%; display: flex; align-items: center; justify-content: center;">
-                        <span style="font-size: 16px;">🚛</span>
-                    </div>
-                ''',
-                icon_size=(25, 25)
-            )
-            
-            folium.Marker(
-                vehicle_position,
-                icon=vehicle_icon,
-                tooltip=f"""
-                <b>{route_id}</b><br>
-                Vehicle: {route_info['vehicle_make']} {route_info['vehicle_model']}<br>
-                Completed: {progress*100:.0f}%<br>
-                Remaining Distance: {remaining_distance/1000:.1f} miles<br>
-                """
-            ).add_to(m)
-            # Add markers for start and end points
-            folium.Marker(
-                locations[0],
-                tooltip=f"Start: {route_info['start']}",
-                icon=folium.DivIcon(
-                    html=f'''
-                        <div style="background-color: #2ecc71; width: 18px; height: 18px; 
-                             border-radius: 50%; border: 2px solid white;">
-                        </div>
-                    ''',
-                    icon_size=(18, 18),
-                )
-            ).add_to(m)
-            
-            folium.Marker(
-                locations[-1],
-                tooltip=f"End: {route_info['end']}",
-                icon=folium.DivIcon(
-                    html=f'''
-                        <div style="background-color: #e74c3c; width: 18px; height: 18px; 
-                             border-radius: 50%; border: 2px solid white;">
-                        </div>
-                    ''',
-                    icon_size=(18, 18),
-                )
-            ).add_to(m)
-
-        # Add layer control
-        folium.LayerControl().add_to(m)
-        
-        # Display the map in Streamlit
-        st_folium(m, width=1400, height=600)
+    view = st.session_state.route_map_view
+    registry = load_registry()
+    live_feed = get_live_feed()
+    # Only routes that intersect the last known map bounds are loaded and drawn
+    visible_routes = set(registry.in_view(view.get('bounds')))
+    base_map = load_live_map(
+        version,
+        tuple(route_id for route_id in selected_routes if route_id in visible_routes),
+        lod_level(view['zoom']),
+        route_summary, route_stops, live_progress
+    )
 
-        # Display route information
-        
-    routes_df, geojson_data = load_data()
+    # Display the map in Streamlit, panning within the same routes and detail level reuses the rendered map
+    with metrics.span('route_map.st_folium'):
+        map_state = show_map(
+            base_map,
+            'route_map',
+            # Live positions go in a separate layer that updates without reloading the map
+            live_vehicle_layer(live_feed.positions, base_map) if live_feed else None,
+            width=1400,
+            height=600,
+            zoom=view['zoom'],
+            center=view['center'],
+            returned_objects=['zoom', 'center', 'bounds']
+        )
+    if map_state and map_state.get('zoom') is not None:
+        center = map_state.get('center') or {}
+        bounds = map_state.get('bounds') or {}
+        new_view = {
+            'center': [center.get('lat', view['center'][0]), center.get('lng', view['center'][1])],
+            'zoom': map_state['zoom'],
+            'bounds': view.get('bounds')
+        }
+        corners = [bounds.get('_southWest') or {}, bounds.get('_northEast') or {}]
+        # Before the browser reports its view the bounds are placeholders without coordinates
+        if all(corner.get('lat') is not None and corner.get('lng') is not None for corner in corners):
+            new_view['bounds'] = [[corner['lat'], corner['lng']] for corner in corners]
+        if new_view != view:
+            st.session_state.route_map_view = new_view
+            # Redraw only when the zoom moved to another detail level or other routes came into view
+            if lod_level(new_view['zoom']) != lod_level(view['zoom']) \
+                    or set(registry.in_view(new_view['bounds'])) != visible_routes:
+                st.rerun(scope="fragment")
+
+def live_status_view():
+    # The map component may be mounted anew, so its next live update sends every position
+    st.session_state.pop('live_markers', None)
+    driver_data_version, driver_data = load_driver_data()
+    route_summary, route_stops = load_route_summary()
+    registry = load_registry()
+    live_progress = load_live_progress(driver_data_version, driver_data)
     # Create a route selector
+    route_ids = registry.route_ids
+    if len(route_ids) > ROUTE_PAGE_SIZE:
+        page_count = (len(route_ids) + ROUTE_PAGE_SIZE - 1) // ROUTE_PAGE_SIZE
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1)
+        route_ids = route_ids[(page - 1) * ROUTE_PAGE_SIZE:page * ROUTE_PAGE_SIZE]
 
-    route_ids = list(geojson_data.keys())
     selected_route = st.pills(
         "Select from Active Vehicles",
         options=route_ids,
         default=route_ids[0],
         selection_mode="single",
-        format_func=lambda x: f"{x} – {routes_df[routes_df['route_id'] == x].iloc[0]['route_description']}"
+        format_func=lambda x: f"{x} – {route_summary[x]['route_description']}"
     )
 
 
+    if not live_progress:
+        st.caption("No GPS trailer is assigned to a route yet, progress comes from the vehicle status data.")
+
     col1, col2= st.columns([7,3], gap="small")
     with col1:
-        create_route_map(route_ids, routes_df, geojson_data)
+        create_route_map(driver_data_version, registry.route_ids, route_summary, route_stops, live_progress)
     with col2:        
    #     current_time = datetime.now().strftime("%H:%M:%S")
      #   st.metric("Last Updated", current_time)
@@ -290,33 +334,36 @@ with tab1:
         if selected_route:
             #st.subheader("Route Details")
             route_id = selected_route
-            route_info = routes_df[routes_df['route_id'] == route_id].iloc[0]
+            route_info = route_summary[route_id]
             # Get the correct progress for this specific route
-            route_progress = st.session_state.route_progress[route_id]
+            route_progress = route_progress_for(route_id, live_progress)
             # Calculate remaining distance and time using the correct progress
-            remaining_distance = route_info['distance'] * (1 - route_progress)
-            total_duration = routes_df[routes_df['route_id'] == route_id]['duration'].sum()
-            remaining_time = total_duration * (1 - route_progress)
-            drive_time = routes_df[(routes_df['route_id'] == route_id) & 
-                                 (routes_df['stop_type'] == 'drive')]['duration'].sum()
-            pause_time = total_duration - drive_time
+            status = core.route_status(load_route_index(route_id), load_eta_index(route_id), route_progress)
+            remaining_distance = status['remaining_distance']
+            remaining_time = status['remaining_time']
             with st.container(border=True, height=600):
                 st.markdown(f"#### 📍 {route_id} – {route_info['route_description']}")
                 col1, col2 = st.columns(2)
                 with col1:
                     st.metric(
                         "Total Distance (miles)", 
-                        f"{route_info['distance']/1000:.1f}",
+                        f"{status['total_distance']/1000:.1f}",
                     )
                 with col2:
                     st.metric(
                         "Total Duration (hours)", 
-                        f"{total_duration/60:.1f}",
+                        f"{status['total_time']/60:.1f}",
                     )
                 with col1:
-                    st.metric("Pause Time", f"{pause_time/60:.1f}")
+                    st.metric("Pause Time", f"{status['stop_time']/60:.1f}")
                 with col2:
-                    st.metric("Time on the Road", f"{drive_time/60:.1f}")
+                    st.metric("Time on the Road", f"{status['drive_time']/60:.1f}")
+                with col1:
+                    st.metric("Remaining Distance (miles)", f"{remaining_distance/1000:.1f}")
+                with col2:
+                    st.metric("Remaining Time (hours)", f"{remaining_time/60:.1f}")
+                with col1:
+                    st.metric("Average Speed (mph)", f"{status['avg_speed']:.1f}")
                 st.write("Vehicle Information:")
                 st.markdown(f"""
                     - Vehicle ID: {route_info['vehicle_id']}
@@ -326,115 +373,41 @@ with tab1:
                     - Fuel Type: {route_info['vehicle_fuelTypePrimary']}
                 """)
 
-def create_geojson_route_map(route_df):
-    """Create a map with the CSV route data colored by road types"""
-    # Use the pre-loaded data
-
-    # Define colors for different road types
-    road_type_colors = {
-        'tertiary': '#FFA500',    # Orange
-        'secondary': '#4169E1',    # Royal Blue
-        'primary': '#FF0000',      # Red
-        'residential': '#32CD32',  # Lime Green
-        'motorway': '#800080',     # Purple
-        'trunk': '#8B4513',        # Saddle Brown
-        'unclassified': '#808080', # Gray
-        'footway': '#FFD700',      # Gold
-        'service': '#20B2AA',      # Light Sea Green
-        'path': '#DDA0DD',         # Plum
-        'cycleway': '#00CED1',     # Dark Turquoise
-        'pedestrian': '#F08080',   # Light Coral
-        'living_street': '#98FB98', # Pale Green
-        'track': '#DEB887'         # Burlywood
-    }
-
-    # Calculate the center point of the route
-    center_lat = route_df['LAT'].mean()
-    center_lon = route_df['LONG'].mean()
-
-    # Create a map centered on the route
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=7)
-
-    # Group the dataframe by road type to draw segments
-    current_road_type = None
-    current_coordinates = []
-    current_segment_info = {}
-
-    for idx, row in route_df.iterrows():
-        if current_road_type != row['road_type']:
-            # Draw the previous segment if it exists
-            if current_coordinates and len(current_segment_info) > 0:
-                color = road_type_colors.get(current_road_type, '#808080')
-                # Create detailed tooltip HTML
-                tooltip_html = f"""
-                <div style='font-family: Arial; font-size: 12px; min-width: 200px; white-space: nowrap;'>
-                    <div style='font-weight: bold; color: {color}; margin-bottom: 4px;'>
-                        {current_segment_info.get('name', 'Unnamed Road')}
-                    </div>
-                    <b>Type:</b> {current_road_type.title()}<br>
-                    <b>Speed Limit:</b> {current_segment_info.get('speed_limit', 'Unknown')}<br>
-                    <b>Lanes:</b> {current_segment_info.get('lanes_total', 'Unknown')}<br>
-                    <b>Surface:</b> {current_segment_info.get('surface', 'Unknown')}
-                </div>
-                """
-                
-                folium.PolyLine(
-                    current_coordinates,
-                    weight=4,
-                    color=color,
-                    opacity=0.8,
-                    tooltip=folium.Tooltip(tooltip_html)
-                ).add_to(m)
-
-            # Start new segment
-            current_road_type = row['road_type']
-            current_coordinates = []
-            current_segment_info = row.to_dict()
-
-        current_coordinates.append([row['LAT'], row['LONG']])
-
-    # Draw the last segment
-    if current_coordinates and len(current_segment_info) > 0:
-        color = road_type_colors.get(current_road_type, '#808080')
-        tooltip_html = f"""
-        <div style='font-family: Arial; font-size: 12px; min-width: 200px; white-space: nowrap;'>
-            <div style='font-weight: bold; color: {color}; margin-bottom: 4px;'>
-                {current_segment_info.get('name', 'Unnamed Road')}
-            </div>
-            <b>Type:</b> {current_road_type.title()}<br>
-            <b>Speed Limit:</b> {current_segment_info.get('speed_limit', 'Unknown')}<br>
-            <b>Lanes:</b> {current_segment_info.get('lanes_total', 'Unknown')}<br>
-            <b>Surface:</b> {current_segment_info.get('surface', 'Unknown')}
-        </div>
-        """
-        
-        folium.PolyLine(
-            current_coordinates,
-            weight=4,
-            color=color,
-            opacity=0.8,
-            tooltip=folium.Tooltip(tooltip_html)
-        ).add_to(m)
-
-    # Add markers for start and end points
-    folium.Marker(
-        [route_df.iloc[0]['LAT'], route_df.iloc[0]['LONG']],
-        popup='Start',
-        icon=folium.Icon(color='green', icon='info-sign')
-    ).add_to(m)
-
-    folium.Marker(
-        [route_df.iloc[-1]['LAT'], route_df.iloc[-1]['LONG']],
-        popup='End',
-        icon=folium.Icon(color='red', icon='info-sign')
-    ).add_to(m)
-
-    return m
-
-with tab2:
-    path = os.path.join(os.path.dirname(__file__), '945_road_type.csv')
-    road_type_df = pd.read_csv(path)
-    
+@metrics.cached('load_road_attribute_index', st.cache_resource)
+def load_road_attribute_index(version):
+    # Spatial index over every attributed road trace, rebuilt when a trace file changes
+    return RoadAttributeIndex(core.load_road_traces())
+
+@metrics.cached('load_route_attributes', st.cache_data)
+def load_route_attributes(route_id, version):
+    # Road attributes joined onto the route geometry, once per route and trace version
+    return enrich_route(load_road_attribute_index(version), route_id, load_route_index(route_id).latlon)
+
+@metrics.cached('load_route_composition', st.cache_data)
+def load_route_composition(route_id, version):
+    # Distance per road type, surface and speed limit, computed once per route and trace version
+    return route_composition(load_route_attributes(route_id, version))
+
+@metrics.cached('load_fleet_compositions', st.cache_data)
+def load_fleet_compositions(version):
+    # Every route's composition, so fleet comparisons never go back to the step tables
+    return {route_id: load_route_composition(route_id, version) for route_id in load_registry().route_ids}
+
+@metrics.cached('load_road_segments', st.cache_data)
+def load_road_segments(route_id, version, _route_df):
+    # Road-type segment table, built once per route and trace version
+    return build_segments(_route_df)
+
+@metrics.cached('load_road_type_map', st.cache_resource)
+def load_road_type_map(route_id, version, _route_df):
+    # Base map with the road-type segments, rendered once per route and trace version
+    rendered = render_map(create_geojson_route_map(_route_df, load_road_segments(route_id, version, _route_df)))
+    metrics.size('road_type_map.script', len(rendered[0]), route_id=route_id)
+    return rendered
+
+# Only this fragment reruns when the timeline slider moves
+@st.fragment
+def show_route_details(road_type_df, route_id, version, route_info):
     # Add play/pause controls
     col1, col2 = st.columns([4,1], gap="small")
     with col1:
@@ -452,8 +425,8 @@ with tab2:
         progress = step / (len(road_type_df) - 1)
         
         # Add custom labels above the slider
-        left_label = "Houston, TX"
-        right_label = "New Orleans, LA"
+        left_label = route_info['start']
+        right_label = route_info['end']
         
         cols = st.columns([1, 4, 1])
         with cols[0]:
@@ -463,8 +436,8 @@ with tab2:
         # Get the current step data
         current_step = road_type_df.iloc[step]
         st.markdown("<br>", unsafe_allow_html=True)
-        # Create the base map showing the complete route
-        m = create_geojson_route_map(road_type_df)
+        # Reuse the cached base map showing the complete route
+        base_map = load_road_type_map(route_id, version, road_type_df)
         
         # Add a marker for the current vehicle position with custom icon
         vehicle_icon = folium.DivIcon(
@@ -476,6 +449,8 @@ with tab2:
             icon_size=(30, 30)
         )
         
+        # The vehicle marker lives in its own layer so moving it doesn't reload the base map
+        vehicle_layer = folium.FeatureGroup(name="Vehicle")
         current_location = [current_step['LAT'], current_step['LONG']]
         folium.Marker(
             current_location,
@@ -489,10 +464,11 @@ with tab2:
                 Name: {current_step['name']}
             </div>
             """
-        ).add_to(m)
+        ).add_to(vehicle_layer)
         
         # Display the map
-        folium_static(m, width=1000, height=500)
+        with metrics.span('road_type_map.st_folium'):
+            show_map(base_map, 'road_type_map', vehicle_layer, width=1000, height=500)
     with col2:
         # Display current road information in a more organized way
         # Add road type color legen        
@@ -502,66 +478,140 @@ with tab2:
         st.metric("Lanes", current_step['lanes_total'])
         
         st.markdown("#### Route Types")
-        # Get unique road types and their percentages
-        road_type_counts = road_type_df['road_type'].value_counts()
-        total_segments = len(road_type_df)
-                # Define colors for different road types (same as in create_geojson_route_map)
-        road_type_colors = {
-            'tertiary': '#FFA500',    # Orange
-            'secondary': '#4169E1',    # Royal Blue
-            'primary': '#FF0000',      # Red
-            'residential': '#32CD32',  # Lime Green
-            'motorway': '#800080',     # Purple
-            'trunk': '#8B4513',        # Saddle Brown
-            'unclassified': '#808080', # Gray
-            'footway': '#FFD700',      # Gold
-            'service': '#20B2AA',      # Light Sea Green
-            'path': '#DDA0DD',         # Plum
-            'cycleway': '#00CED1',     # Dark Turquoise
-            'pedestrian': '#F08080',   # Light Coral
-            'living_street': '#98FB98', # Pale Green
-            'track': '#DEB887'         # Burlywood
-        }
+        # Share of the route's distance, not of its step rows
+        composition = load_route_composition(route_id, version)
+        road_types = composition[composition['attribute'] == 'road_type']
         # Create legend with colored boxes and percentages
-        for road_type in road_type_counts.index:
-            percentage = (road_type_counts[road_type] / total_segments) * 100
-            color = road_type_colors.get(road_type, '#808080')
+        for road_type, share in zip(road_types['value'], road_types['share']):
+            color = ROAD_TYPE_COLORS.get(road_type, DEFAULT_ROAD_COLOR)
             st.markdown(
                 f"""
                 <div style="display: flex; align-items: center; margin: 2px 0; font-size: 0.9em;">
                     <div style="width: 12px; height: 12px; background-color: {color}; 
                               margin-right: 6px; border-radius: 2px;"></div>
                     <div style="flex-grow: 1;">{road_type.title()}</div>
-                    <div style="color: #666;">{percentage:.1f}%</div>
+                    <div style="color: #666;">{share * 100:.1f}%</div>
                 </div>
                 """,
                 unsafe_allow_html=True
             )
 
-with tab3:
-    # Load the driver data
-        # Convert timestamp column to string to make it editable
-    st.session_state.driver_data['timestamp'] = st.session_state.driver_data['timestamp'].astype(str)
-    
-    # Function to check if timestamp matches the correct format
-    def is_valid_timestamp(ts):
-        try:
-            datetime.strptime(ts, '%Y-%m-%d %H:%M:%S')
-            return True
-        except ValueError:
-            return False
-    
-    # Add a column for format validation
-    st.session_state.driver_data['is_valid_format'] = st.session_state.driver_data['timestamp'].apply(is_valid_timestamp)
-    
+def route_details_view():
+    registry = load_registry()
+    route_summary, _ = load_route_summary()
+    version = core.road_trace_version()
+    # Start on a route that has attributed road data
+    covered = [route_id for route_id in registry.route_ids if route_id in load_road_attribute_index(version).trace_ids]
+    route_id = st.selectbox(
+        "Vehicle",
+        registry.route_ids,
+        index=registry.route_ids.index(covered[0]) if covered else 0,
+        format_func=lambda x: f"{x} – {route_summary[x]['route_description']}"
+    )
+    road_type_df = load_route_attributes(route_id, version)
+    if (road_type_df['road_type'] == UNKNOWN).all():
+        st.info("No road attribute data covers this route yet.")
+    show_route_details(road_type_df, route_id, version, route_summary[route_id])
+
+    # Opt-in, composing every route is only worth it when someone asks for the comparison
+    if st.toggle("Fleet Road Composition"):
+        attribute = st.selectbox(
+            "Attribute",
+            COMPOSITION_COLUMNS,
+            format_func=lambda x: x.replace('_', ' ').title()
+        )
+        compositions = load_fleet_compositions(version)
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            # Share of each route's distance, one row per route
+            st.dataframe(
+                composition_matrix(compositions, attribute).mul(100).round(1),
+                use_container_width=True
+            )
+        with col2:
+            fleet = fleet_composition(compositions)
+            fleet = fleet[fleet['attribute'] == attribute]
+            st.dataframe(
+                pd.DataFrame({
+                    attribute: fleet['value'],
+                    'miles': fleet['distance'] * core.MILES_FACTOR / 1000,
+                    'share (%)': fleet['share'] * 100
+                }).round(1),
+                use_container_width=True,
+                hide_index=True
+            )
+
+@metrics.cached('find_invalid_timestamps', st.cache_data(max_entries=4))
+def find_invalid_timestamps(version, _driver_data):
+    # Validated once per version of the shared table, sessions only get the invalid subset
+    return core.find_invalid_timestamps(_driver_data)
+
+@metrics.cached('propose_timestamp_repairs', st.cache_data(max_entries=4))
+def propose_timestamp_repairs(version, _incorrect_timestamps):
+    # Each trailer's own dominant format settles day/month ambiguities
+    return repair_timestamps(_incorrect_timestamps['timestamp'], groups=_incorrect_timestamps['trailer_id'])
+
+def save_rows(rows):
+    # Upload in batches with a progress bar. Only the table load is retried, a failure after it
+    # (like the write event KeboolaStreamlit.write_table sends) would load the chunk twice
+    progress_bar = st.progress(0.0, text="Saving corrected data to Keboola...")
+    write_batches(
+        get_driver_table().source.write,
+        rows,
+        progress=lambda done, total: progress_bar.progress(done / total, text=f"Saved {done} of {total} rows")
+    )
+    # One write event for the whole save, create_event reports its own errors
+    get_keboola().create_event(
+        message="Streamlit App Write Table",
+        endpoint=f"{st.secrets['kbc_url']}/v2/storage/tables/{st.secrets['table_id']}/import-async",
+        event_data=rows,
+        event_type="keboola_data_app_write_table"
+    )
+
+@metrics.cached('load_trip_analytics', st.cache_data(max_entries=4))
+def load_trip_analytics(version, _driver_data):
+    # Speeds, dwell times and gaps computed once per version of the shared table
+    return analyze_pings(_driver_data[PING_COLUMNS])
+
+def data_quality_view():
+    driver_table = get_driver_table()
+    driver_data_version, driver_data = load_driver_data()
+
     # Get only invalid timestamps
-    incorrect_timestamps = st.session_state.driver_data[~st.session_state.driver_data['is_valid_format']]
+    incorrect_timestamps = find_invalid_timestamps(driver_data_version, driver_data)
+    repairs = propose_timestamp_repairs(driver_data_version, incorrect_timestamps)
+    is_repaired = (repairs['status'] == 'repaired').to_numpy()
     
     if len(incorrect_timestamps) > 0:
         st.warning(f"Found {len(incorrect_timestamps)} rows with incorrect timestamp format.")
         st.markdown("""
         The timestamps should be in the following format: `YYYY-MM-DD HH:MM:SS`
         """)
+
+    if is_repaired.any():
+        repaired_rows = incorrect_timestamps[is_repaired].drop('is_valid_format', axis=1)
+        repaired_rows['timestamp'] = repairs['repaired'][is_repaired]
+        st.info(f"{is_repaired.sum()} timestamps can be repaired automatically.")
+        with st.expander("Proposed repairs"):
+            st.dataframe(
+                pd.DataFrame({
+                    'trailer_id': repaired_rows['trailer_id'],
+                    'original': incorrect_timestamps['timestamp'][is_repaired],
+                    'repaired': repaired_rows['timestamp'],
+                    'format': repairs['format'][is_repaired]
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        if st.button("Apply Repairs"):
+            try:
+                save_rows(repaired_rows.drop_duplicates(subset=driver_table.source.primary_key or None, keep='last'))
+                st.success(f"{len(repaired_rows)} repaired rows successfully saved!")
+            except Exception as e:
+                st.error(f"An error occurred while saving: {str(e)}")
+
+    # Only what couldn't be repaired automatically is left for manual editing
+    manual_timestamps = incorrect_timestamps[~is_repaired]
     
     # Create column configuration for the editor
     column_config = {
@@ -573,10 +623,10 @@ with tab3:
     }
     
     # Display only rows with invalid timestamps
-    edited_df = st.data_editor(
-        incorrect_timestamps,
+    st.data_editor(
+        manual_timestamps,
         key='timestamp_editor',
-        disabled=[col for col in incorrect_timestamps.columns if col != 'timestamp'],
+        disabled=[col for col in manual_timestamps.columns if col != 'timestamp'],
         column_config=column_config,
         use_container_width=True,
         height=500,
@@ -586,27 +636,122 @@ with tab3:
     col1, col2, col3, col4, col5 = st.columns(5)
     if col1.button("Save to Keboola", type="primary"):
         try:
-            # Update the validation column
-            edited_df['is_valid_format'] = edited_df['timestamp'].apply(is_valid_timestamp)
-            # Check if there are still invalid timestamps
-            edited_df = edited_df[edited_df['is_valid_format']]
-            valid_rows = edited_df.drop('is_valid_format', axis=1)
-            with st.spinner(f"Saving corrected data to Keboola..."):
-                keboola.write_table(TABLE_ID, valid_rows, is_incremental=True)
-            st.success("Data successfully saved!")
+            # Only rows the user actually edited are uploaded, not every displayed row
+            edits = st.session_state['timestamp_editor']['edited_rows']
+            changed = edited_rows(manual_timestamps, edits, driver_table.source.primary_key)
+            changed = changed.drop('is_valid_format', axis=1)
+            is_valid = valid_timestamp_mask(changed['timestamp'])
+            valid_rows = changed[is_valid]
+            if len(valid_rows) == 0:
+                st.info("No corrected rows to save.")
+            else:
+                save_rows(valid_rows)
+                st.success(f"{len(valid_rows)} corrected rows successfully saved!")
+            if (~is_valid).any():
+                st.warning(f"{(~is_valid).sum()} edited rows still have an incorrect timestamp and were not saved.")
     
         except Exception as e:
             st.error(f"An error occurred while saving: {str(e)}")
 
     if col5.button("Reload Data", type="tertiary", use_container_width=True):
-        # Remove from session state and reload
-        if 'driver_data' in st.session_state:
-            del st.session_state.driver_data
+        # Check for changes now instead of waiting for the cache to expire
         with st.spinner("Reloading data..."):
-            st.session_state.driver_data = keboola.read_table(TABLE_ID)
-            # Convert timestamp column to string to make it editable
-            st.session_state.driver_data['timestamp'] = st.session_state.driver_data['timestamp'].astype(str)
+            driver_table.sync(force=True)
         st.rerun()
 
+    if set(PING_COLUMNS).issubset(driver_data.columns):
+        st.markdown("#### Trip Analytics")
+        trip_segments, trip_summary = load_trip_analytics(driver_data_version, driver_data)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Distance (km)", f"{trip_summary['distance_km'].sum():,.0f}")
+        col2.metric("Dwell Time (hours)", f"{trip_summary['dwell_hours'].sum():,.1f}")
+        col3.metric("Data Gaps", int(trip_summary['gaps'].sum()))
+        col4.metric("Impossible Jumps", int(trip_summary['impossible_jumps'].sum()))
+        st.dataframe(trip_summary, use_container_width=True)
+
+        impossible = trip_segments[trip_segments['is_impossible']]
+        if len(impossible) > 0:
+            st.warning(f"Found {len(impossible)} jumps faster than a truck can drive.")
+            st.dataframe(
+                impossible.drop(columns=['is_dwell', 'is_gap', 'is_impossible']),
+                use_container_width=True,
+                hide_index=True
+            )
+
+@metrics.cached('load_track_index', st.cache_resource(max_entries=4))
+def load_track_index(version, _driver_data):
+    # Pings sorted into per-trailer tracks once per version of the shared table
+    return TrackIndex(_driver_data[PING_COLUMNS])
+
+@metrics.cached('load_replay_map', st.cache_resource(max_entries=8))
+def load_replay_map(version, start, end, step, _track_index):
+    # Every frame interpolated in one go, the animation then plays in the browser
+    frames = _track_index.frames(start, end, step)[:MAX_REPLAY_FRAMES]
+    lat, lon = _track_index.interpolate(frames)
+    rendered = render_map(replay_map(_track_index.trailer_ids, frames, lat, lon, MAP_CENTER, MAP_ZOOM, step))
+    metrics.size('replay_map.script', len(rendered[0]), frames=len(frames))
+    return rendered
+
+# Only this fragment reruns when the time slider moves, the replay map stays as it is
+@st.fragment
+def show_positions_at(track_index, first, last):
+    st.markdown("#### Positions at")
+    moment = first
+    if first < last:
+        moment = st.slider("Time", min_value=first, max_value=last, value=last, format="YYYY-MM-DD HH:mm",
+                           label_visibility="collapsed")
+    st.dataframe(track_index.positions_at(moment), use_container_width=True, hide_index=True)
+
+def replay_view():
+    driver_data_version, driver_data = load_driver_data()
+    if not set(PING_COLUMNS).issubset(driver_data.columns):
+        st.info("The driver data has no GPS pings to replay.")
+        return
+    track_index = load_track_index(driver_data_version, driver_data)
+    if len(track_index.seconds) == 0:
+        st.info("No GPS pings with a valid timestamp to replay.")
+        return
+
+    first = pd.Timestamp(track_index.start, unit='s').to_pydatetime()
+    last = pd.Timestamp(track_index.end, unit='s').to_pydatetime()
+    if first == last:
+        # st.slider needs a range, a single moment is replayed as a single frame
+        st.info(f"All GPS pings are from {first:%Y-%m-%d %H:%M}, there is only one frame to replay.")
+        start, end, step = first, last, REPLAY_STEPS["1 hour"]
+    else:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            start, end = st.slider("Period", min_value=first, max_value=last, value=(first, last),
+                                   format="YYYY-MM-DD HH:mm")
+        with col2:
+            step = REPLAY_STEPS[st.selectbox("Frame every", list(REPLAY_STEPS), index=2)]
+        if (end - start).total_seconds() / step >= MAX_REPLAY_FRAMES:
+            st.info(f"Only the first {MAX_REPLAY_FRAMES} frames are replayed, shorten the period or pick longer frames.")
+
+    with metrics.span('replay_map.st_folium'):
+        show_map(load_replay_map(driver_data_version, start, end, step, track_index), 'replay_map', width=1400, height=600)
+
+    show_positions_at(track_index, first, last)
+
+if view == VIEWS[0]:
+    live_status_view()
+elif view == VIEWS[1]:
+    route_details_view()
+elif view == VIEWS[2]:
+    data_quality_view()
+else:
+    replay_view()
+
+if DEBUG_PANEL:
+    with st.sidebar:
+        st.header("Performance")
+        st.markdown("**Timings (seconds)**")
+        st.dataframe(metrics.summary('span'), use_container_width=True)
+        st.markdown("**Map size (bytes)**")
+        st.dataframe(metrics.summary('size'), use_container_width=True)
+        st.markdown("**Cache**")
+        st.dataframe(metrics.cache_stats(), use_container_width=True)
+        st.download_button("Export Events", metrics.export(), file_name="perf_events.jsonl", mime="application/json")
+
 if __name__ == "__main__":
     pass  # Main execution is now handled by the tabs
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""Benchmarks of the dashboard's data paths on synthetic fleets
+
+Run ``python bench.py`` (see --help for the fleet size) to time the core
+functions headlessly, without a Streamlit server or Keboola credentials. Each
+result is one JSON line, written to stdout and appended to bench_output.txt,
+so runs on different commits can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import load_routes, route_status
+from eta import EtaIndex
+from geometry import RouteIndex, build_lods, lod_for_zoom
+from keboola_sync import MemoryTableSource, TableSync
+from map_layers import ROUTE_COLORS, create_geojson_route_map, route_map
+from map_matching import RouteMatcher, live_route_progress
+from road_composition import composition_matrix, fleet_composition, route_composition
+from road_enrichment import RoadAttributeIndex, enrich_route
+from replay import TrackIndex
+from road_types import build_segments
+from route_summary import STOP_TYPES, build_route_summary, group_stops
+from trip_analytics import analyze_pings
+from validation import TIMESTAMP_FORMAT, repair_timestamps, valid_timestamp_mask
+
+OUTPUT_PATH = 'bench_output.txt'
+
+ROAD_TYPES = ['motorway', 'trunk', 'primary', 'secondary', 'tertiary', 'residential']
+# Timestamps in formats a bad feed might send instead of TIMESTAMP_FORMAT
+MALFORMED_FORMATS = ['%d/%m/%Y %H:%M', '%Y-%m-%dT%H:%M:%S', '%m/%d/%Y %H:%M:%S']
+
+
+def synthetic_routes(n_routes, n_vertices, seed=0):
+    """Random-walk route geometries across the continental US, as [lat, lon] arrays"""
+    rng = np.random.default_rng(seed)
+    routes = []
+    for _ in range(n_routes):
+        start = rng.uniform([30, -120], [45, -75])
+        heading = rng.uniform(0, 2 * np.pi)
+        # Roughly 1 km steps that slowly change direction
+        headings = heading + np.cumsum(rng.normal(0, 0.1, n_vertices))
+        steps = np.column_stack([np.sin(headings), np.cos(headings)]) * 0.01
+        routes.append(start + np.cumsum(steps, axis=0))
+    return routes
+
+
+def synthetic_routes_table(routes, stops_per_route=10, seed=0):
+    """A table shaped like 1routes.csv: start, drive and stop rows per route"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i, latlon in enumerate(routes):
+        route_id = f'ROUTE_{i + 1}'
+        base = {
+            'route_id': route_id,
+            'route_description': f'Synthetic route {i + 1}',
+            'start': 'Origin', 'end': 'Destination',
+            'destination_latitude': latlon[-1, 0], 'destination_longitude': latlon[-1, 1],
+            'route_status': 'Active', 'route_category': 'Freight',
+            'vehicle_id': f'V{i + 1:05d}', 'vehicle_make': 'Freightliner', 'vehicle_model': 'Cascadia'
+        }
+        rows.append(dict(base, stop_type='start', origin_latitude=latlon[0, 0], origin_longitude=latlon[0, 1],
+                         distance=len(latlon) * 1000.0, duration=0.0))
+        for vertex in np.sort(rng.choice(len(latlon), size=min(stops_per_route, len(latlon)), replace=False)):
+            rows.append(dict(base, stop_type='drive', origin_latitude=latlon[vertex, 0],
+                             origin_longitude=latlon[vertex, 1], distance=0.0, duration=float(rng.uniform(60, 300))))
+            rows.append(dict(base, stop_type=rng.choice(STOP_TYPES), origin_latitude=latlon[vertex, 0],
+                             origin_longitude=latlon[vertex, 1], distance=0.0, duration=float(rng.uniform(15, 600))))
+    return pd.DataFrame(rows)
+
+
+def synthetic_road_trace(latlon, seed=0):
+    """Per-step road attributes along a route, shaped like 945_road_type.csv"""
+    rng = np.random.default_rng(seed)
+    n = len(latlon)
+    # Road type changes every 20 steps on average
+    runs = np.cumsum(rng.random(n) < 0.05)
+    road_type = np.array(ROAD_TYPES)[rng.integers(0, len(ROAD_TYPES), runs[-1] + 1)[runs]]
+    return pd.DataFrame({
+        'ID': 'ROUTE_1',
+        'STEP': np.arange(1, n + 1),
+        'LAT': latlon[:, 0],
+        'LONG': latlon[:, 1],
+        'road_type': road_type,
+        'name': [f'Road {run}' for run in runs],
+        'speed_limit': np.array(['30 mph', '45 mph', '65 mph'])[runs % 3],
+        'lanes_total': runs % 4 + 1,
+        'surface': np.where(runs % 5 == 0, 'concrete', 'asphalt')
+    })
+
+
+def synthetic_pings(n_pings, n_trailers, malformed_share=0.01, seed=0):
+    """A GPS ping table shaped like gps_data_cleaned.csv, with a share of malformed timestamps"""
+    rng = np.random.default_rng(seed)
+    trailer = rng.integers(0, n_trailers, n_pings)
+    times = pd.Timestamp('2025-01-27') + pd.to_timedelta(rng.integers(0, 30 * 86400, n_pings), unit='s')
+    timestamps = pd.Series(times.strftime(TIMESTAMP_FORMAT), dtype=object)
+    malformed = np.flatnonzero(rng.random(n_pings) < malformed_share)
+    for i, fmt in enumerate(MALFORMED_FORMATS):
+        rows = malformed[i::len(MALFORMED_FORMATS)]
+        timestamps.iloc[rows] = times[rows].strftime(fmt)
+    return pd.DataFrame({
+        'trailer_id': np.char.add('Trailer_', (trailer + 1).astype(str)),
+        'latitude': rng.uniform(30, 45, n_pings),
+        'longitude': rng.uniform(-120, -75, n_pings),
+        'timestamp': timestamps
+    })
+
+
+def synthetic_steps(route_index, vertices_per_step=50, seed=0):
+    """ORS-style steps over a route: way point range, distance and a duration at 40 to 110 km/h"""
+    rng = np.random.default_rng(seed)
+    bounds = np.append(np.arange(0, len(route_index.cumdist) - 1, vertices_per_step), len(route_index.cumdist) - 1)
+    distance = np.diff(route_index.cumdist[bounds])
+    duration = distance / rng.uniform(11, 31, len(distance))
+    return np.column_stack([bounds[:-1], bounds[1:], distance, duration])
+
+
+def build_route_map(indexes, lods, etas, summary, stops, zoom=6):
+    """The live map's fleet-scale path: split lines plus batched marker layers"""
+    routes = []
+    for i, (route_id, route_index) in enumerate(indexes.items()):
+        indices = lod_for_zoom(lods[route_id], zoom, len(route_index.latlon))
+        completed, remaining = route_index.split(0.5, indices)
+        routes.append({
+            'route_id': route_id,
+            'info': summary[route_id],
+            'stops': stops.get(route_id, []),
+            'color': ROUTE_COLORS[i % len(ROUTE_COLORS)],
+            'progress': 0.5,
+            'remaining_distance': route_status(route_index, etas[route_id], 0.5)['remaining_distance'],
+            'completed': completed,
+            'remaining': remaining
+        })
+    return route_map(routes, [37.0902, -85.7129], zoom, batched=True).get_root().render()
+
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Time every benchmark, yielding one result dict each"""
+    routes = synthetic_routes(args.routes, args.vertices, args.seed)
+    routes_df = synthetic_routes_table(routes, seed=args.seed)
+    trace = synthetic_road_trace(routes[0], args.seed)
+    pings = synthetic_pings(args.pings, args.trailers, args.malformed, args.seed)
+
+    indexes = {f'ROUTE_{i + 1}': RouteIndex(latlon) for i, latlon in enumerate(routes)}
+    lods = {route_id: build_lods(index.latlon) for route_id, index in indexes.items()}
+    summary = build_route_summary(routes_df).to_dict('index')
+    stops = group_stops(routes_df)
+    steps = {route_id: synthetic_steps(index, seed=args.seed) for route_id, index in indexes.items()}
+    stop_rows = {
+        route_id: [(stop['origin_latitude'], stop['origin_longitude'], stop['duration']) for stop in stops.get(route_id, [])]
+        for route_id in indexes
+    }
+    etas = {route_id: EtaIndex(index, steps[route_id], stop_rows[route_id]) for route_id, index in indexes.items()}
+    matchers = {route_id: RouteMatcher({route_id: index}) for route_id, index in indexes.items()}
+    # Trailer k drives route k
+    trailer_routes = {f'Trailer_{i + 1}': route_id for i, route_id in enumerate(indexes)}
+    segments = build_segments(trace)
+    attribute_index = RoadAttributeIndex(trace)
+    compositions = {route_id: route_composition(trace) for route_id in indexes}
+    progresses = np.random.default_rng(args.seed).random(1000)
+    track_index = TrackIndex(pings)
+    # One frame per hour over the whole ping table
+    frames = np.arange(track_index.start, track_index.end + 1, 3600)
+
+    # Writes to the in-memory table stand in for saving edits to Keboola
+    def keboola_sync():
+        sync = TableSync(MemoryTableSource(pings, primary_key=['trailer_id', 'timestamp']))
+        sync.sync()
+        sync.source.write(pings.iloc[:1000])
+        sync.sync()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        routes_csv = os.path.join(tmp, '1routes.csv')
+        routes_df.to_csv(routes_csv, index=False)
+
+        benchmarks = {
+            'load_data': lambda: load_routes(routes_csv),
+            'route_summary': lambda: (build_route_summary(routes_df), group_stops(routes_df)),
+            'route_index': lambda: [RouteIndex(latlon) for latlon in routes],
+            'build_lods': lambda: [build_lods(index.latlon) for index in indexes.values()],
+            'split_route': lambda: [indexes['ROUTE_1'].split(progress) for progress in progresses],
+            'eta_index': lambda: [EtaIndex(index, steps[route_id], stop_rows[route_id]) for route_id, index in indexes.items()],
+            'fleet_eta': lambda: [eta.remaining_time(progresses) for eta in etas.values()],
+            'route_map': lambda: build_route_map(indexes, lods, etas, summary, stops),
+            'road_segments': lambda: build_segments(trace),
+            'road_enrichment': lambda: [enrich_route(attribute_index, route_id, index.latlon) for route_id, index in indexes.items()],
+            'road_composition': lambda: route_composition(trace),
+            'fleet_composition': lambda: (fleet_composition(compositions), composition_matrix(compositions)),
+            'road_type_map': lambda: create_geojson_route_map(trace, segments).get_root().render(),
+            'keboola_sync': keboola_sync,
+            'valid_timestamp_mask': lambda: valid_timestamp_mask(pings['timestamp']),
+            'repair_timestamps': lambda: repair_timestamps(pings['timestamp'], groups=pings['trailer_id']),
+            'trip_analytics': lambda: analyze_pings(pings),
+            'track_index': lambda: TrackIndex(pings),
+            'replay_frames': lambda: track_index.interpolate(frames),
+            'live_route_progress': lambda: live_route_progress(pings, trailer_routes.get, matchers.__getitem__, 5000),
+        }
+        for name, func in benchmarks.items():
+            if args.only and name not in args.only:
+                continue
+            times = timeit(func, args.repeat)
+            yield {
+                'name': name,
+                'min': min(times),
+                'median': float(np.median(times)),
+                'mean': float(np.mean(times)),
+                'repeat': args.repeat
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', type=int, default=50, help='number of synthetic routes')
+    parser.add_argument('--vertices', type=int, default=5000, help='vertices per route')
+    parser.add_argument('--pings', type=int, default=200_000, help='rows in the GPS ping table')
+    parser.add_argument('--trailers', type=int, default=500, help='trailers in the GPS ping table')
+    parser.add_argument('--malformed', type=float, default=0.01, help='share of malformed timestamps')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', help='names of the benchmarks to run')
+    parser.add_argument('--output', default=OUTPUT_PATH, help='file the JSON lines are appended to')
+    args = parser.parse_args(argv)
+
+    params = {key: value for key, value in vars(args).items() if key not in ('only', 'output')}
+    context = {'commit': git_commit(), 'python': platform.python_version(), 'params': params, 'time': time.time()}
+    with open(args.output, 'a') as out:
+        for result in run(args):
+            line = json.dumps(dict(result, **context))
+            print(line)
+            out.write(line + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
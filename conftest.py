@@ -0,0 +1,9 @@
+# Lets the tests import the top-level modules however pytest is started, and holds their shared fixtures
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def straight_line():
+    # Points along the equator, one every 0.01 degrees of longitude
+    return np.column_stack([np.zeros(11), np.linspace(0, 0.1, 11)])
@@ -0,0 +1,86 @@
+"""Data loading and per-route figures for the dashboard, independent of Streamlit
+
+Everything here works on the bundled files and plain DataFrames, so the hot
+paths can be imported, profiled and benchmarked without a Streamlit server or
+Keboola credentials. app.py only wraps these functions in Streamlit caches.
+"""
+import os
+
+import pandas as pd
+
+from eta import EtaIndex
+from geometry import RouteIndex
+from registry import RouteRegistry
+from route_store import (DATA_DIR, load_route_latlon, load_route_steps, read_geometry_catalog, read_table,
+                         road_trace_files)
+from validation import valid_timestamp_mask
+
+ROUTES_PATH = os.path.join(DATA_DIR, '1routes.csv')
+STATUS_PATH = os.path.join(DATA_DIR, '1routes_vehicles_status.csv')
+
+# Distances are scaled by this and shown divided by 1000 as miles
+MILES_FACTOR = 0.621371
+
+
+def load_routes(path=ROUTES_PATH):
+    """Route rows with distance converted for display in miles"""
+    routes_df = read_table(path)
+    routes_df['distance'] = routes_df['distance'] * MILES_FACTOR
+    return routes_df
+
+
+def load_registry(path=STATUS_PATH):
+    """Routes and vehicles from the status table, geometries matched by their endpoints"""
+    return RouteRegistry(read_table(path), read_geometry_catalog())
+
+
+def load_route_index(registry, route_id):
+    return RouteIndex(load_route_latlon(registry.geometry_files[route_id]))
+
+
+def road_trace_version():
+    """Modification times of the road trace files, changes whenever a trace is added or updated"""
+    return tuple((os.path.basename(path), os.path.getmtime(path)) for path in road_trace_files())
+
+
+def load_road_traces():
+    """All attributed road traces in one table"""
+    return pd.concat([read_table(path) for path in road_trace_files()], ignore_index=True)
+
+
+def load_eta_index(registry, route_id, route_index, stops):
+    """ETA index from the route's ORS steps and its planned stop rows"""
+    return EtaIndex(
+        route_index,
+        load_route_steps(registry.geometry_files[route_id]),
+        [(stop['origin_latitude'], stop['origin_longitude'], stop['duration']) for stop in stops]
+    )
+
+
+def route_status(route_index, eta_index, progress):
+    """Total and remaining distance (shown /1000 as miles), total, driving, stop and remaining
+    time (minutes) and average driving speed (mph)
+
+    Distances come from the route geometry and times from the ETA index, so
+    every remaining figure is a part of the total shown next to it.
+    """
+    drive_hours = eta_index.drive_time / 3600
+    return {
+        'total_distance': route_index.total * MILES_FACTOR,
+        'remaining_distance': route_index.remaining_distance(progress) * MILES_FACTOR,
+        'total_time': (eta_index.drive_time + eta_index.stop_time) / 60,
+        'drive_time': eta_index.drive_time / 60,
+        'stop_time': eta_index.stop_time / 60,
+        'remaining_time': float(eta_index.remaining_time(progress)),
+        'avg_speed': route_index.total * MILES_FACTOR / 1000 / drive_hours if drive_hours else 0.0
+    }
+
+
+def find_invalid_timestamps(driver_data):
+    """Rows with an incorrectly formatted timestamp, the timestamp as a string so it can be edited"""
+    timestamps = driver_data['timestamp'].astype(str)
+    is_valid = valid_timestamp_mask(timestamps)
+    incorrect_timestamps = driver_data[~is_valid].copy()
+    incorrect_timestamps['timestamp'] = timestamps[~is_valid]
+    incorrect_timestamps['is_valid_format'] = False
+    return incorrect_timestamps
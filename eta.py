@@ -0,0 +1,70 @@
+"""Remaining-time estimates from ORS step durations and planned stops
+
+Each ORS step's duration is spread over the geometry vertices it covers in
+proportion to distance, giving cumulative driving time against cumulative
+distance. Planned stops are placed at their distance along the route. The
+remaining time at any position is then two binary searches, vectorized over
+any number of positions.
+"""
+import numpy as np
+
+from geometry import haversine
+
+
+class EtaIndex:
+    """Cumulative driving time and planned stops along a route"""
+
+    def __init__(self, route_index, steps, stops=()):
+        """steps is an (n, 4) array of ORS steps (first and last way point, distance, duration in seconds),
+        stops are (lat, lon, duration in minutes) tuples of the planned stops
+        """
+        cumdist = route_index.cumdist
+        self.cumdist = cumdist
+        self.total_distance = route_index.total
+
+        # Driving time of every geometry segment, taken from the step that covers it
+        segment_time = np.zeros(max(len(cumdist) - 1, 0))
+        if len(steps) and len(segment_time):
+            start = np.clip(steps[:, 0].astype(int), 0, len(cumdist) - 1)
+            end = np.clip(steps[:, 1].astype(int), 0, len(cumdist) - 1)
+            duration = steps[:, 3]
+            length = cumdist[end] - cumdist[start]
+            empty = length <= 0
+            # Steps without length (waits, arrival) add their time where they start
+            np.add.at(segment_time, np.minimum(start[empty], len(segment_time) - 1), duration[empty])
+
+            order = np.argsort(start[~empty], kind='stable')
+            start, end, duration, length = (values[~empty][order] for values in (start, end, duration, length))
+            segments = np.arange(len(segment_time))
+            step = np.searchsorted(start, segments, side='right') - 1
+            covered = step >= 0
+            step = np.maximum(step, 0)
+            covered &= segments < end[step]
+            segment_time += np.where(covered, duration[step] * np.diff(cumdist) / length[step], 0.0)
+        self.cumtime = np.concatenate([[0.0], np.cumsum(segment_time)])
+        self.drive_time = float(self.cumtime[-1])
+
+        # Planned stops at the distance of their nearest route vertex
+        stops = np.asarray(list(stops), dtype=float).reshape(-1, 3)
+        latlon = np.asarray(route_index.latlon)
+        stop_distance = np.array([
+            cumdist[np.argmin(haversine(lat, lon, latlon[:, 0], latlon[:, 1]))] for lat, lon, _ in stops
+        ])
+        order = np.argsort(stop_distance, kind='stable')
+        self.stop_distance = stop_distance[order]
+        self.stop_cumtime = np.concatenate([[0.0], np.cumsum(stops[order, 2] * 60)])
+        self.stop_time = float(self.stop_cumtime[-1])
+
+    def remaining_drive_time(self, progress):
+        """Seconds of driving left at the given share(s) of the route distance"""
+        distance = np.clip(progress, 0.0, 1.0) * self.total_distance
+        return self.drive_time - np.interp(distance, self.cumdist, self.cumtime)
+
+    def remaining_stop_time(self, progress):
+        """Seconds of planned stops left, a stop at the current position still counts"""
+        distance = np.clip(progress, 0.0, 1.0) * self.total_distance
+        return self.stop_time - self.stop_cumtime[np.searchsorted(self.stop_distance, distance, side='left')]
+
+    def remaining_time(self, progress):
+        """Minutes of driving and planned stops left at the given share(s) of the route distance"""
+        return (self.remaining_drive_time(progress) + self.remaining_stop_time(progress)) / 60
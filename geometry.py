@@ -0,0 +1,127 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Zoom levels we precompute simplified route geometries for. Anything above the
+# last level is drawn at full resolution.
+LOD_ZOOMS = (4, 6, 8, 10, 12)
+
+
+def to_latlon(coordinates):
+    """Convert GeoJSON [lon, lat] coordinates into an (n, 2) array of [lat, lon]"""
+    coords = np.asarray(coordinates, dtype=float)
+    return coords[:, [1, 0]]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters, works element-wise on arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def cumulative_distance(latlon):
+    """Distance in meters from the first vertex to every vertex of the line"""
+    steps = haversine(latlon[:-1, 0], latlon[:-1, 1], latlon[1:, 0], latlon[1:, 1])
+    return np.concatenate([[0.0], np.cumsum(steps)])
+
+
+class RouteIndex:
+    """Cumulative-distance index over a route for distance-based progress lookups"""
+
+    def __init__(self, latlon):
+        self.latlon = latlon
+        self.cumdist = cumulative_distance(latlon)
+        self.total = float(self.cumdist[-1])
+
+    def distance_at(self, progress):
+        return min(max(progress, 0.0), 1.0) * self.total
+
+    def remaining_distance(self, progress):
+        return self.total - self.distance_at(progress)
+
+    def position_at(self, progress):
+        """Segment index and interpolated [lat, lon] at the given share of the route distance"""
+        if len(self.cumdist) < 2:
+            return 0, self.latlon[0].tolist()
+        target = self.distance_at(progress)
+        i = int(np.searchsorted(self.cumdist, target, side='right')) - 1
+        i = min(max(i, 0), len(self.cumdist) - 2)
+        length = self.cumdist[i + 1] - self.cumdist[i]
+        t = (target - self.cumdist[i]) / length if length > 0 else 0.0
+        point = self.latlon[i] + (self.latlon[i + 1] - self.latlon[i]) * t
+        return i, point.tolist()
+
+    def split(self, progress, indices=None):
+        """Completed and remaining polylines, both ending/starting at the interpolated position
+
+        indices optionally selects a simplified subset of the vertices to draw.
+        """
+        if indices is None:
+            indices = np.arange(len(self.latlon))
+        _, point = self.position_at(progress)
+        k = int(np.searchsorted(self.cumdist[indices], self.distance_at(progress), side='right'))
+        completed = self.latlon[indices[:k]].tolist() + [point]
+        remaining = [point] + self.latlon[indices[k:]].tolist()
+        return completed, remaining
+
+
+def tolerance_for_zoom(zoom):
+    """Simplification tolerance in degrees, roughly one screen pixel at the given zoom"""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplify(latlon, tolerance):
+    """Douglas-Peucker simplification, returns the indices of the vertices to keep"""
+    n = len(latlon)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+
+    # Scale longitude so the tolerance means roughly the same on both axes
+    scale = np.cos(np.radians(latlon[:, 0].mean()))
+    points = np.column_stack([latlon[:, 0], latlon[:, 1] * scale])
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        interior = points[start + 1:end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(interior[:, 0] - a[0], interior[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (interior[:, 1] - a[1]) - ab[1] * (interior[:, 0] - a[0])) / length
+        i = int(dist.argmax())
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return np.flatnonzero(keep)
+
+
+def build_lods(latlon, zooms=LOD_ZOOMS):
+    """Precompute simplified vertex indices of a route for each zoom level"""
+    return {zoom: simplify(latlon, tolerance_for_zoom(zoom)) for zoom in zooms}
+
+
+def lod_level(zoom, zooms=LOD_ZOOMS):
+    """Coarsest precomputed level that is still detailed enough for the given zoom, None for full resolution"""
+    for level in sorted(zooms):
+        if level >= zoom:
+            return level
+    return None
+
+
+def lod_for_zoom(lods, zoom, n):
+    """Vertex indices to draw at the given zoom"""
+    level = lod_level(zoom, lods.keys())
+    if level is None:
+        return np.arange(n)
+    return lods[level]
@@ -0,0 +1,110 @@
+"""Timing spans, payload sizes and cache counters for the dashboard's hot paths
+
+Every span and size is kept in a bounded in-memory log for the debug sidebar.
+When the 'gps.perf' logger is enabled for INFO, each is also emitted on it as
+one JSON line, so production logs can be searched for regressions.
+"""
+import collections
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+
+import pandas as pd
+
+# Number of recent events kept in memory
+EVENT_LOG_SIZE = 5000
+
+logger = logging.getLogger('gps.perf')
+
+
+class Metrics:
+    """Thread-safe collector shared by all sessions of a server process"""
+
+    def __init__(self, log_size=EVENT_LOG_SIZE):
+        self.events = collections.deque(maxlen=log_size)
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, value, **fields):
+        event = dict(fields, kind=kind, name=name, value=value, time=time.time())
+        with self._lock:
+            self.events.append(event)
+        # Serializing every event costs more than recording it, only done when someone listens
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(event, default=str))
+
+    @contextlib.contextmanager
+    def span(self, name, **fields):
+        """Time the enclosed block, recorded in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record('span', name, time.perf_counter() - start, **fields)
+
+    def size(self, name, nbytes, **fields):
+        self.record('size', name, nbytes, **fields)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def cached(self, name, cache):
+        """Wrap a function in a Streamlit cache decorator, counting calls and misses
+
+        Used as @metrics.cached('load_data', st.cache_data) in place of
+        @st.cache_data. The function body only runs on a miss, so hits are
+        calls minus misses.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def miss(*args, **kwargs):
+                self.count(f'{name}.miss')
+                return func(*args, **kwargs)
+
+            cached_func = cache(miss)
+
+            @functools.wraps(func)
+            def call(*args, **kwargs):
+                self.count(f'{name}.call')
+                with self.span(name):
+                    return cached_func(*args, **kwargs)
+
+            call.clear = cached_func.clear
+            return call
+        return decorator
+
+    def cache_stats(self):
+        """Calls, hits and misses per cached function"""
+        with self._lock:
+            counters = dict(self.counters)
+        names = sorted({key.rsplit('.', 1)[0] for key in counters})
+        stats = pd.DataFrame({
+            'calls': [counters.get(f'{name}.call', 0) for name in names],
+            'misses': [counters.get(f'{name}.miss', 0) for name in names]
+        }, index=pd.Index(names, name='name'))
+        stats['hits'] = stats['calls'] - stats['misses']
+        return stats
+
+    def summary(self, kind='span'):
+        """Count, mean, p95 and max per event name"""
+        with self._lock:
+            events = [event for event in self.events if event['kind'] == kind]
+        if not events:
+            return pd.DataFrame(columns=['count', 'mean', 'p95', 'max'])
+        values = pd.DataFrame(events).groupby('name')['value']
+        return pd.DataFrame({
+            'count': values.size(),
+            'mean': values.mean(),
+            'p95': values.quantile(0.95),
+            'max': values.max()
+        })
+
+    def export(self):
+        """Recent events as JSON lines"""
+        with self._lock:
+            events = list(self.events)
+        return '\n'.join(json.dumps(event, default=str) for event in events)
@@ -0,0 +1,160 @@
+import tempfile
+import threading
+import time
+
+import pandas as pd
+from kbcstorage.client import Client
+
+# Rows per upload when writing changes back to Keboola
+WRITE_BATCH_SIZE = 50_000
+
+
+class KeboolaTableSource:
+    """Reads a Keboola Storage table, optionally only the rows changed since a given time"""
+
+    def __init__(self, root_url, token, table_id):
+        self.client = Client(root_url, token)
+        self.table_id = table_id
+        self._detail = None
+
+    @property
+    def primary_key(self):
+        if self._detail is None:
+            self._detail = self.client.tables.detail(self.table_id)
+        return self._detail.get('primaryKey', [])
+
+    def last_change(self):
+        self._detail = self.client.tables.detail(self.table_id)
+        return self._detail['lastChangeDate']
+
+    def read(self, changed_since=None):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.client.tables.export_to_file(self.table_id, tmp, changed_since=changed_since)
+            return pd.read_csv(path)
+
+    def write(self, rows):
+        """Incremental load of rows, upserted on the primary key
+
+        Only the load itself, so repeating it for the same rows is safe on a
+        table with a primary key.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/rows.csv"
+            rows.to_csv(path, index=False)
+            self.client.tables.load(self.table_id, path, is_incremental=True)
+
+
+class MemoryTableSource:
+    """In-memory stand-in for a Keboola table, for local runs and tests"""
+
+    def __init__(self, df, primary_key=None):
+        self.primary_key = list(primary_key or [])
+        self._version = 0
+        self._changed = pd.Series(0, index=range(len(df)))
+        self._df = df.reset_index(drop=True)
+
+    def last_change(self):
+        return self._version
+
+    def read(self, changed_since=None):
+        if changed_since is None:
+            return self._df.copy()
+        return self._df[(self._changed > changed_since).to_numpy()].reset_index(drop=True)
+
+    def write(self, rows):
+        """Upsert rows the same way an incremental load into Keboola would"""
+        self._version += 1
+        df = pd.concat([self._df, rows], ignore_index=True)
+        changed = pd.concat([self._changed, pd.Series(self._version, index=range(len(rows)))], ignore_index=True)
+        keep = ~df.duplicated(subset=self.primary_key or None, keep='last').to_numpy()
+        self._df = df[keep].reset_index(drop=True)
+        self._changed = changed[keep].reset_index(drop=True)
+
+
+def merge_changes(data, changes, primary_key=None):
+    """Merge changed rows into a local copy, newer rows win on the primary key"""
+    if len(changes) == 0:
+        return data
+    merged = pd.concat([data, changes], ignore_index=True)
+    return merged.drop_duplicates(subset=primary_key or None, keep='last', ignore_index=True)
+
+
+def edited_rows(df, edits, primary_key=None):
+    """Rows of df that were really changed in a st.data_editor, with the edits applied
+
+    edits is the editor's edited_rows state, {row position: {column: new value}}.
+    Cells set back to their original value don't count as changes.
+    """
+    # Positions past the end are left over from an older version of df
+    edits = sorted((int(position), cells) for position, cells in edits.items() if int(position) < len(df))
+    changed = df.iloc[[position for position, _ in edits]].copy()
+    is_changed = pd.Series(False, index=changed.index)
+    for label, (_, cells) in zip(changed.index, edits):
+        for column, value in cells.items():
+            if changed.at[label, column] != value:
+                changed.at[label, column] = value
+                is_changed[label] = True
+    changed = changed[is_changed]
+    return changed.drop_duplicates(subset=primary_key or None, keep='last')
+
+
+def write_batches(write, rows, batch_size=WRITE_BATCH_SIZE, retries=3, backoff=1.0, progress=None):
+    """Upload rows with write(chunk) in chunks of batch_size
+
+    A failed chunk is retried with exponential backoff, the last error is
+    raised once retries run out, so write must only do what can safely be
+    repeated for a chunk. progress(done, total) is called after every chunk.
+    Returns the number of rows written.
+    """
+    total = len(rows)
+    for start in range(0, total, batch_size):
+        chunk = rows.iloc[start:start + batch_size]
+        for attempt in range(retries + 1):
+            try:
+                write(chunk)
+                break
+            except Exception:
+                if attempt == retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+        if progress is not None:
+            progress(start + len(chunk), total)
+    return total
+
+
+class TableSync:
+    """Local copy of a table that is kept current by fetching only changed rows
+
+    Safe to share between threads. The copy is only checked for changes once
+    it is older than ttl seconds (or when forced), and version is bumped every
+    time the data changes. sync returns (version, data) as one consistent pair;
+    callers must treat data as read-only.
+    """
+
+    def __init__(self, source, ttl=None):
+        self.source = source
+        self.ttl = ttl
+        self.data = None
+        self.marker = None
+        self.version = 0
+        self.checked_at = None
+        self._lock = threading.Lock()
+
+    def sync(self, force=False):
+        with self._lock:
+            if not force and self.data is not None and self.ttl is not None \
+                    and time.monotonic() - self.checked_at < self.ttl:
+                return self.version, self.data
+            # Take the marker before reading so rows changed during the read are fetched again next time
+            marker = self.source.last_change()
+            if self.data is None:
+                self.data = self.source.read()
+                self.version += 1
+            elif marker != self.marker:
+                changes = self.source.read(changed_since=self.marker)
+                self.data = merge_changes(self.data, changes, self.source.primary_key)
+                self.version += 1
+            self.marker = marker
+            self.checked_at = time.monotonic()
+            return self.version, self.data
+
@@ -0,0 +1,140 @@
+"""Background ingestion of live GPS pings
+
+A LiveFeed thread polls a ping source (a CSV file that is appended to) and
+keeps the latest position of every vehicle in LivePositions. Every update
+gets a sequence number, so a reader can ask for just the vehicles that moved
+since its last refresh.
+"""
+import collections
+import csv
+import os
+import threading
+
+import pandas as pd
+
+from validation import TIMESTAMP_FORMAT
+
+# Number of updates remembered for incremental reads, older readers get a full snapshot
+CHANGE_LOG_SIZE = 1000
+
+
+class FileTailSource:
+    """Pings appended to a CSV file with trailer_id, latitude, longitude and timestamp columns"""
+
+    def __init__(self, path):
+        self.path = path
+        self._offset = 0
+        self._columns = None
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self._offset:
+                # The file was truncated or rotated, start over
+                self._offset = 0
+                self._columns = None
+            f.seek(self._offset)
+            data = f.read()
+        # Leave a partially written last line for the next read
+        data = data[:data.rfind(b'\n') + 1]
+        self._offset += len(data)
+
+        rows = list(csv.reader(data.decode('utf-8').splitlines()))
+        if self._columns is None and rows:
+            self._columns = {name: i for i, name in enumerate(rows.pop(0))}
+        if not rows:
+            return []
+        pings = []
+        c = self._columns
+        for row in rows:
+            try:
+                pings.append((row[c['trailer_id']], float(row[c['latitude']]), float(row[c['longitude']]), row[c['timestamp']]))
+            except (IndexError, ValueError):
+                # Skip malformed lines
+                continue
+        return pings
+
+
+class LivePositions:
+    """Latest known position per vehicle"""
+
+    def __init__(self):
+        self.seq = 0
+        self._positions = {}
+        # Parsed time of every known position, timestamp strings don't sort by time
+        self._times = {}
+        self._log = collections.deque(maxlen=CHANGE_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def update(self, pings):
+        """Apply (vehicle_id, lat, lon, timestamp) pings, older pings than the known position are ignored"""
+        times = pd.to_datetime(
+            pd.Series([ping[3] for ping in pings], dtype=object).astype(str), format=TIMESTAMP_FORMAT, errors='coerce'
+        )
+        with self._lock:
+            changed = set()
+            for (vehicle, lat, lon, timestamp), time in zip(pings, times):
+                current = self._positions.get(vehicle)
+                if pd.isna(time) or (current is not None and time < self._times[vehicle]):
+                    continue
+                if current is None or (lat, lon) != current[:2]:
+                    self._positions[vehicle] = (lat, lon, timestamp)
+                    self._times[vehicle] = time
+                    changed.add(vehicle)
+            if changed:
+                self.seq += 1
+                self._log.append((self.seq, changed))
+            return changed
+
+    def changes_since(self, seq):
+        """(current seq, {vehicle_id: (lat, lon, timestamp)}) for the vehicles that moved after seq
+
+        A seq older than the change log, e.g. -1, gets every known position.
+        """
+        with self._lock:
+            if not self._log or seq < self._log[0][0] - 1 or seq > self.seq:
+                return self.seq, dict(self._positions)
+            changed = set()
+            for entry_seq, vehicles in reversed(self._log):
+                if entry_seq <= seq:
+                    break
+                changed |= vehicles
+            return self.seq, {vehicle: self._positions[vehicle] for vehicle in changed}
+
+
+class LiveFeed:
+    """Polls a ping source on a daemon thread and keeps LivePositions current"""
+
+    def __init__(self, source, interval=1.0):
+        self.source = source
+        self.interval = interval
+        self.positions = LivePositions()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def poll(self):
+        pings = self.source.read()
+        if pings:
+            self.positions.update(pings)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except (OSError, KeyError, UnicodeDecodeError):
+                # A file being replaced or missing columns shouldn't kill the feed
+                pass
+            self._stop.wait(self.interval)
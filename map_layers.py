@@ -0,0 +1,397 @@
+"""Folium layers and maps for the dashboard
+
+Instead of one folium.Marker (and one icon) per stop or vehicle, the batched
+layers ship their points as a single data array and build the markers in the
+browser with icons that are defined once and shared.
+"""
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement, Template
+from folium import plugins
+
+# Marker color and glyphicon per stop type
+STOP_ICONS = {
+    'sleep': ('purple', 'bed'),
+    'gas': ('green', 'gas-station'),
+    'break': ('lightgray', 'cutlery'),
+}
+DEFAULT_STOP_ICON = ('lightblue', 'glyphicon-info-sign')
+
+
+def stop_icon(stop_type):
+    return STOP_ICONS.get(stop_type, DEFAULT_STOP_ICON)
+
+
+def stop_layer(rows):
+    """All stops in one clustered layer, rows are [lat, lon, stop_type, tooltip_html]"""
+    specs = dict(STOP_ICONS, **{'': DEFAULT_STOP_ICON})
+    callback = f"""(function () {{
+        var specs = {json.dumps(specs)};
+        var icons = {{}};
+        for (var type in specs) {{
+            icons[type] = L.AwesomeMarkers.icon({{
+                icon: specs[type][1], prefix: 'glyphicon', markerColor: specs[type][0], iconColor: 'white'
+            }});
+        }}
+        return function (row) {{
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {{icon: icons[row[2]] || icons['']}});
+            marker.bindTooltip(row[3], {{maxWidth: 300}});
+            return marker;
+        }};
+    }})()"""
+    return plugins.FastMarkerCluster(rows, callback=callback, name='Stops')
+
+
+def vehicle_layer(rows):
+    """All vehicles in one layer, rows are [lat, lon, color, tooltip_html]"""
+    callback = """(function () {
+        var icons = {};
+        return function (row) {
+            if (!(row[2] in icons)) {
+                icons[row[2]] = L.divIcon({
+                    className: '',
+                    iconSize: [25, 25],
+                    html: '<div style="color: ' + row[2] + '; background-color: ' + row[2] + '; width: 30px; height: 30px; ' +
+                          'border-radius: 50%; display: flex; align-items: center; justify-content: center;">' +
+                          '<span style="font-size: 16px;">🚛</span></div>'
+                });
+            }
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icons[row[2]]});
+            marker.bindTooltip(row[3]);
+            return marker;
+        };
+    })()"""
+    return plugins.FastMarkerCluster(rows, callback=callback, name='Vehicles', disableClusteringAtZoom=7)
+
+
+def endpoint_layer(rows):
+    """Route start and end points in one layer, rows are [lat, lon, color, tooltip]"""
+    callback = """function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            radius: 9, color: 'white', weight: 2, fillColor: row[2], fillOpacity: 1
+        });
+        marker.bindTooltip(row[3]);
+        return marker;
+    }"""
+    return plugins.FastMarkerCluster(rows, callback=callback, name='Start / End', disableClusteringAtZoom=7)
+
+
+class RenderedMap(folium.Map):
+    """Stand-in for a map whose script was generated once before
+
+    Generating the script of a large map is most of the cost of showing it.
+    A RenderedMap has no layers of its own, it only carries that script, so
+    it shows exactly like the original map at almost no cost. The script
+    stays the same, so the map component isn't reloaded either.
+    """
+
+    _template = Template("{% macro script(this, kwargs) %}{{ this.script }}{% endmacro %}")
+
+    def __init__(self, script, location, zoom_start):
+        super().__init__(location=location, zoom_start=zoom_start, tiles=None)
+        self.script = script
+
+    def render(self, **kwargs):
+        # Already rendered into the script
+        pass
+
+
+class LiveVehicleUpdate(MacroElement):
+    """Adds or moves the live vehicle markers already shown in the browser
+
+    The markers are kept on the map in a layer of their own, outside the
+    overlay st_folium replaces on every refresh, so an update only carries
+    the vehicles that moved. With reset the markers shown so far are dropped
+    first, for a map that may have been drawn anew.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent._parent.get_name() }};
+            if (!map.liveVehicles || {{ this.reset|tojson }}) {
+                if (map.liveVehicles) {
+                    map.removeLayer(map.liveVehicles);
+                }
+                map.liveVehicles = L.layerGroup().addTo(map);
+                map.liveVehicleMarkers = {};
+            }
+            var icon = L.AwesomeMarkers.icon({icon: 'road', prefix: 'glyphicon', markerColor: 'black'});
+            {{ this.rows|tojson }}.forEach(function (row) {
+                var marker = map.liveVehicleMarkers[row[0]];
+                if (marker) {
+                    marker.setLatLng([row[1], row[2]]).setTooltipContent(row[3]);
+                } else {
+                    map.liveVehicleMarkers[row[0]] = L.marker([row[1], row[2]], {icon: icon})
+                        .bindTooltip(row[3]).addTo(map.liveVehicles);
+                }
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, positions, reset=False):
+        """positions maps vehicle_id to (lat, lon, timestamp), the layer goes into a FeatureGroup on the map"""
+        super().__init__()
+        self._name = 'LiveVehicleUpdate'
+        self.rows = [
+            [vehicle, lat, lon, f"<b>{vehicle}</b><br>Last seen: {timestamp}"]
+            for vehicle, (lat, lon, timestamp) in positions.items()
+        ]
+        self.reset = reset
+
+
+# Line colors of the road-type map, also used by its legend
+ROAD_TYPE_COLORS = {
+    'tertiary': '#FFA500',    # Orange
+    'secondary': '#4169E1',    # Royal Blue
+    'primary': '#FF0000',      # Red
+    'residential': '#32CD32',  # Lime Green
+    'motorway': '#800080',     # Purple
+    'trunk': '#8B4513',        # Saddle Brown
+    'unclassified': '#808080', # Gray
+    'footway': '#FFD700',      # Gold
+    'service': '#20B2AA',      # Light Sea Green
+    'path': '#DDA0DD',         # Plum
+    'cycleway': '#00CED1',     # Dark Turquoise
+    'pedestrian': '#F08080',   # Light Coral
+    'living_street': '#98FB98', # Pale Green
+    'track': '#DEB887'         # Burlywood
+}
+DEFAULT_ROAD_COLOR = '#808080'
+
+
+def create_geojson_route_map(route_df, segments):
+    """Create a map with the CSV route data colored by road types"""
+    # Calculate the center point of the route
+    center_lat = route_df['LAT'].mean()
+    center_lon = route_df['LONG'].mean()
+
+    # Create a map centered on the route
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=7)
+
+    # Draw one line per run of consecutive steps with the same road type
+    for segment in segments.itertuples(index=False):
+        color = ROAD_TYPE_COLORS.get(segment.road_type, DEFAULT_ROAD_COLOR)
+        # Create detailed tooltip HTML
+        tooltip_html = f"""
+        <div style='font-family: Arial; font-size: 12px; min-width: 200px; white-space: nowrap;'>
+            <div style='font-weight: bold; color: {color}; margin-bottom: 4px;'>
+                {segment.name}
+            </div>
+            <b>Type:</b> {segment.road_type.title()}<br>
+            <b>Speed Limit:</b> {segment.speed_limit}<br>
+            <b>Lanes:</b> {segment.lanes_total}<br>
+            <b>Surface:</b> {segment.surface}
+        </div>
+        """
+
+        folium.PolyLine(
+            segment.coordinates.tolist(),
+            weight=4,
+            color=color,
+            opacity=0.8,
+            tooltip=folium.Tooltip(tooltip_html)
+        ).add_to(m)
+
+    # Add markers for start and end points
+    folium.Marker(
+        [route_df.iloc[0]['LAT'], route_df.iloc[0]['LONG']],
+        popup='Start',
+        icon=folium.Icon(color='green', icon='info-sign')
+    ).add_to(m)
+
+    folium.Marker(
+        [route_df.iloc[-1]['LAT'], route_df.iloc[-1]['LONG']],
+        popup='End',
+        icon=folium.Icon(color='red', icon='info-sign')
+    ).add_to(m)
+
+    return m
+
+
+# Line colors of the routes on the live map, picked by route position
+ROUTE_COLORS = ['darkred', 'darkblue', 'darkgreen', 'purple', 'orange']
+
+
+def route_map(routes, center, zoom, batched=False):
+    """The live status map with every route split at its vehicle's position
+
+    routes are dicts with route_id, info (its route summary row), stops,
+    color, progress, remaining_distance and the completed and remaining
+    polylines. With batched, markers go into a few shared clustered layers
+    instead of one marker each.
+    """
+    # Create a base map centered on central US with closer zoom
+    m = folium.Map(
+        location=center,
+        zoom_start=zoom,
+        tiles='cartodbpositron'
+    )
+    stop_rows, vehicle_rows, endpoint_rows = [], [], []
+
+    for route in routes:
+        route_id, route_info, color = route['route_id'], route['info'], route['color']
+        completed_route, remaining_route = route['completed'], route['remaining']
+
+        # Draw completed portion of route (darker)
+        folium.PolyLine(
+            locations=completed_route,
+            weight=4,
+            color=color,
+            opacity=0.9
+        ).add_to(m)
+
+        # Draw remaining portion of route (lighter) only if there are remaining points
+        if len(remaining_route) > 1:
+            plugins.AntPath(
+                locations=remaining_route,
+                weight=3,
+                color=color,
+                opacity=0.6,
+                popup=f"Route: {route_id} ({route_info['route_description']})",
+                delay=1000,
+                dash_array=[10, 20],
+                pulse_color='#FFF'
+            ).add_to(m)
+
+        # Add stop markers for this route
+        for stop in route['stops']:
+            # Create popup content
+            popup_content = f"""
+                <b>Stop Type:</b> {stop['stop_type'].title()}<br>
+                <b>Description:</b> {stop['route_description']}<br>
+                <b>Duration:</b> {stop['duration']/60:.1f} hours
+            """
+            stop_location = [stop['origin_latitude'], stop['origin_longitude']]
+            if batched:
+                stop_rows.append(stop_location + [stop['stop_type'], popup_content])
+                continue
+
+            # Set icon color and icon type based on stop type
+            icon_color, icon_name = stop_icon(stop['stop_type'])
+            icon = folium.Icon(
+                icon=icon_name,
+                prefix='glyphicon',  # Using Bootstrap Glyphicons
+                color=icon_color,
+                icon_color='white',  # Use white for the icon color
+            )
+
+            folium.Marker(
+                location=stop_location,
+                tooltip=folium.Tooltip(popup_content, max_width=300),
+                icon=icon
+            ).add_to(m)
+
+        # Add vehicle marker at current position (use the last point of the route if 100% complete)
+        vehicle_position = completed_route[-1]
+
+        vehicle_tooltip = f"""
+            <b>{route_id}</b><br>
+            Vehicle: {route_info['vehicle_make']} {route_info['vehicle_model']}<br>
+            Completed: {route['progress']*100:.0f}%<br>
+            Remaining Distance: {route['remaining_distance']/1000:.1f} miles<br>
+            """
+        if batched:
+            vehicle_rows.append(list(vehicle_position) + [color, vehicle_tooltip])
+            endpoint_rows.append(list(completed_route[0]) + ['#2ecc71', f"Start: {route_info['start']}"])
+            endpoint_rows.append(list(remaining_route[-1]) + ['#e74c3c', f"End: {route_info['end']}"])
+            continue
+
+        vehicle_icon = folium.DivIcon(
+            html=f'''
+                <div style="font-family: FontAwesome; color: {color}; background-color: {color}; width: 30px; height: 30px; border-radius: 50%; display: flex; align-items: center; justify-content: center;">
+                    <span style="font-size: 16px;">🚛</span>
+                </div>
+            ''',
+            icon_size=(25, 25)
+        )
+
+        folium.Marker(
+            vehicle_position,
+            icon=vehicle_icon,
+            tooltip=vehicle_tooltip
+        ).add_to(m)
+        # Add markers for start and end points
+        folium.Marker(
+            completed_route[0],
+            tooltip=f"Start: {route_info['start']}",
+            icon=folium.DivIcon(
+                html=f'''
+                    <div style="background-color: #2ecc71; width: 18px; height: 18px; 
+                         border-radius: 50%; border: 2px solid white;">
+                    </div>
+                ''',
+                icon_size=(18, 18),
+            )
+        ).add_to(m)
+
+        folium.Marker(
+            remaining_route[-1],
+            tooltip=f"End: {route_info['end']}",
+            icon=folium.DivIcon(
+                html=f'''
+                    <div style="background-color: #e74c3c; width: 18px; height: 18px; 
+                         border-radius: 50%; border: 2px solid white;">
+                    </div>
+                ''',
+                icon_size=(18, 18),
+            )
+        ).add_to(m)
+
+    if batched:
+        stop_layer(stop_rows).add_to(m)
+        endpoint_layer(endpoint_rows).add_to(m)
+        vehicle_layer(vehicle_rows).add_to(m)
+
+    # Add layer control
+    folium.LayerControl().add_to(m)
+    return m
+
+
+def replay_map(trailer_ids, frames, lat, lon, center, zoom, step):
+    """Animated playback of vehicle positions, played in the browser
+
+    frames are epoch seconds every step seconds, lat and lon are
+    (frames, trailers) arrays with NaN where a trailer has no position.
+    Each trailer is one MultiPoint feature whose points each show for one
+    frame, so the server builds the map once and never reruns per frame.
+    """
+    m = folium.Map(location=center, zoom_start=zoom, tiles='cartodbpositron')
+    times = np.asarray(pd.to_datetime(frames, unit='s').strftime('%Y-%m-%dT%H:%M:%S'))
+    features = []
+    for k, trailer_id in enumerate(trailer_ids):
+        seen = ~np.isnan(lat[:, k])
+        if not seen.any():
+            continue
+        color = ROUTE_COLORS[k % len(ROUTE_COLORS)]
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'MultiPoint',
+                'coordinates': np.column_stack([lon[seen, k], lat[seen, k]]).round(6).tolist()
+            },
+            'properties': {
+                'times': times[seen].tolist(),
+                'popup': str(trailer_id),
+                'icon': 'circle',
+                'iconstyle': {'fillColor': color, 'fillOpacity': 0.9, 'stroke': 'true', 'color': 'white', 'radius': 7}
+            }
+        })
+    period = f'PT{int(step)}S'
+    plugins.TimestampedGeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        period=period,
+        duration=period,
+        transition_time=200,
+        add_last_point=False,
+        auto_play=False,
+        loop=False,
+        max_speed=20,
+        loop_button=True,
+        time_slider_drag_update=True
+    ).add_to(m)
+    return m
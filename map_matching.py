@@ -0,0 +1,133 @@
+"""Snap GPS pings onto route geometries
+
+A KD-tree over all route vertices (as 3D unit vectors, so distances are right
+everywhere on the globe) finds candidate vertices for each ping; the segments
+next to those candidates are then checked with a vectorized projection.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from geometry import haversine
+from validation import TIMESTAMP_FORMAT
+
+CHUNK_SIZE = 200_000
+PING_COLUMNS = ['trailer_id', 'latitude', 'longitude', 'timestamp']
+
+
+def to_unit_xyz(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class RouteMatcher:
+    """Spatial index over the segments of many routes"""
+
+    def __init__(self, route_indexes):
+        """route_indexes maps route_id to a geometry.RouteIndex"""
+        self.route_ids = list(route_indexes)
+        indexes = [route_indexes[route_id] for route_id in self.route_ids]
+        lengths = [len(index.latlon) for index in indexes]
+
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.latlon = np.concatenate([np.asarray(index.latlon) for index in indexes])
+        self.cumdist = np.concatenate([index.cumdist for index in indexes])
+        self.totals = np.array([index.total for index in indexes])
+        self.route_codes = np.repeat(np.arange(len(indexes)), lengths)
+        self.tree = cKDTree(to_unit_xyz(self.latlon[:, 0], self.latlon[:, 1]))
+
+    def snap(self, lat, lon, k=8, max_distance=None):
+        """Snap pings to their nearest route segment
+
+        Returns one row per ping with route_id, segment (index of the segment
+        start within its route), the snapped latitude/longitude, distance in
+        meters from the ping and progress along the route. Pings farther than
+        max_distance from every route get a missing route_id.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        parts = [
+            self._snap_chunk(lat[start:start + CHUNK_SIZE], lon[start:start + CHUNK_SIZE], k)
+            for start in range(0, len(lat), CHUNK_SIZE)
+        ]
+        if not parts:
+            return pd.DataFrame(columns=['route_id', 'segment', 'latitude', 'longitude', 'distance', 'progress'])
+        result = pd.concat(parts, ignore_index=True)
+        if max_distance is not None:
+            result.loc[result['distance'] > max_distance, 'route_id'] = None
+        return result
+
+    def _snap_chunk(self, lat, lon, k):
+        n = len(self.latlon)
+        k = min(k, n)
+        _, nearest = self.tree.query(to_unit_xyz(lat, lon), k=k)
+        nearest = nearest.reshape(len(lat), k)
+
+        # Candidate segments start at each nearest vertex or the one before it
+        starts = np.concatenate([nearest - 1, nearest], axis=1)
+        valid = (starts >= 0) & (starts + 1 < n)
+        starts = np.clip(starts, 0, max(n - 2, 0))
+        ends = np.minimum(starts + 1, n - 1)
+        valid &= self.route_codes[starts] == self.route_codes[ends]
+
+        # Project in a local plane around each ping, longitude scaled by latitude
+        scale = np.cos(np.radians(lat))[:, None]
+        ax = (self.latlon[starts, 1] - lon[:, None]) * scale
+        ay = self.latlon[starts, 0] - lat[:, None]
+        bx = (self.latlon[ends, 1] - lon[:, None]) * scale
+        by = self.latlon[ends, 0] - lat[:, None]
+        dx, dy = bx - ax, by - ay
+        length2 = dx ** 2 + dy ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(length2 > 0, -(ax * dx + ay * dy) / length2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        d2 = (ax + t * dx) ** 2 + (ay + t * dy) ** 2
+        d2[~valid] = np.inf
+
+        best = d2.argmin(axis=1)
+        rows = np.arange(len(lat))
+        segment = starts[rows, best]
+        t = t[rows, best]
+        snapped = self.latlon[segment] + (self.latlon[np.minimum(segment + 1, n - 1)] - self.latlon[segment]) * t[:, None]
+
+        codes = self.route_codes[segment]
+        along = self.cumdist[segment] + t * (self.cumdist[np.minimum(segment + 1, n - 1)] - self.cumdist[segment])
+        totals = self.totals[codes]
+        return pd.DataFrame({
+            'route_id': np.array(self.route_ids, dtype=object)[codes],
+            'segment': segment - self.offsets[codes],
+            'latitude': snapped[:, 0],
+            'longitude': snapped[:, 1],
+            'distance': haversine(lat, lon, snapped[:, 0], snapped[:, 1]),
+            'progress': np.divide(along, totals, out=np.zeros_like(along), where=totals > 0)
+        })
+
+
+def live_route_progress(pings, route_for_vehicle, matcher_for_route, max_distance):
+    """Route progress from the latest ping of every trailer assigned to a route
+
+    pings needs trailer_id, latitude, longitude and timestamp columns.
+    route_for_vehicle(trailer_id) gives the trailer's route or None, and
+    matcher_for_route(route_id) a RouteMatcher over just that route, so a
+    ping is only ever placed on its own trailer's route. Pings farther than
+    max_distance from it don't count. When several trailers share a route,
+    the most recent ping wins. Routes without an assigned trailer are left
+    out, so with no assignment at all the result is empty.
+    """
+    if not set(PING_COLUMNS).issubset(pings.columns):
+        return {}
+    timestamps = pd.to_datetime(pings['timestamp'].astype(str), format=TIMESTAMP_FORMAT, errors='coerce')
+    pings = pings.assign(timestamp=timestamps).dropna(subset=['timestamp', 'latitude', 'longitude'])
+    latest = pings.sort_values('timestamp').groupby('trailer_id').tail(1)
+    latest = latest.assign(route_id=latest['trailer_id'].map(route_for_vehicle)).dropna(subset=['route_id'])
+
+    progress = {}
+    for route_id, rows in latest.groupby('route_id', sort=False):
+        snapped = matcher_for_route(route_id).snap(
+            rows['latitude'].to_numpy(), rows['longitude'].to_numpy(), max_distance=max_distance
+        )
+        on_route = snapped[snapped['route_id'].notna()]
+        if len(on_route):
+            # Rows are in time order, the last one is the most recent ping
+            progress[route_id] = float(on_route['progress'].iloc[-1])
+    return progress
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+ENDPOINT_COLUMNS = ['origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude']
+# Status columns naming what is assigned to a route, GPS pings identify themselves by one of these.
+# The bundled status data only has vehicle_id (V001...) while pings carry trailer_id (Trailer_1...),
+# so no ping maps to a route until the status table in Keboola gets a trailer_id column
+VEHICLE_COLUMNS = ['vehicle_id', 'trailer_id']
+
+
+def _endpoint_key(values):
+    return tuple(round(float(v), 4) for v in values)
+
+
+class RouteRegistry:
+    """Routes, their vehicles and geometry files, looked up by route_id or vehicle_id
+
+    Built from the vehicle status table (one row per route) and the geometry
+    catalog from route_store. Geometries are matched to routes by their origin
+    and destination, so adding a route only means adding data.
+    """
+
+    def __init__(self, status_df, catalog_df):
+        files = {
+            _endpoint_key(row[1:]): row[0]
+            for row in catalog_df[['file'] + ENDPOINT_COLUMNS].itertuples(index=False)
+        }
+        status = status_df.drop_duplicates('route_id')
+
+        self.routes = {}
+        self.geometry_files = {}
+        self.vehicles = {}
+        for row in status.to_dict('records'):
+            route_id = row['route_id']
+            filename = files.get(_endpoint_key(row[column] for column in ENDPOINT_COLUMNS))
+            if filename is None:
+                # No geometry for this route yet, nothing to draw
+                continue
+            self.routes[route_id] = row
+            self.geometry_files[route_id] = filename
+            for column in VEHICLE_COLUMNS:
+                if pd.notna(row.get(column)):
+                    self.vehicles[row[column]] = route_id
+
+        self.route_ids = list(self.routes)
+        self._positions = {route_id: i for i, route_id in enumerate(self.route_ids)}
+        bounds = catalog_df.set_index('file')[['min_lat', 'min_lon', 'max_lat', 'max_lon']]
+        self._bounds = bounds.loc[[self.geometry_files[r] for r in self.route_ids]].to_numpy(dtype=float).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.route_ids)
+
+    def route(self, route_id):
+        return self.routes[route_id]
+
+    def route_for_vehicle(self, vehicle_id):
+        """Route the vehicle or trailer is assigned to, None when it has none"""
+        return self.vehicles.get(vehicle_id)
+
+    def position(self, route_id):
+        """Stable position of a route, e.g. for picking its color"""
+        return self._positions[route_id]
+
+    def progress(self, route_id):
+        progress = self.routes[route_id].get('progress')
+        return 0.0 if progress is None or pd.isna(progress) else float(progress)
+
+    def in_view(self, bounds=None):
+        """Route ids whose bounding box intersects bounds ([[south, west], [north, east]])"""
+        if bounds is None:
+            return list(self.route_ids)
+        (south, west), (north, east) = bounds
+        b = self._bounds
+        visible = (b[:, 0] <= north) & (b[:, 2] >= south) & (b[:, 1] <= east) & (b[:, 3] >= west)
+        return [self.route_ids[i] for i in np.flatnonzero(visible)]
@@ -0,0 +1,79 @@
+"""Time-indexed vehicle tracks for replaying historical GPS pings
+
+All pings are sorted by trailer and time into flat NumPy arrays, with one
+contiguous run per trailer. Every trailer's times are shifted into its own
+non-overlapping band, so a single searchsorted finds the surrounding pings of
+every trailer at once, for one time or a whole sequence of frames.
+"""
+import numpy as np
+import pandas as pd
+
+from validation import TIMESTAMP_FORMAT
+
+
+class TrackIndex:
+    """Per-trailer tracks over a ping table for position lookups by time"""
+
+    def __init__(self, pings):
+        """pings needs trailer_id, latitude, longitude and timestamp columns
+
+        Pings with an unparseable timestamp or position are left out.
+        """
+        timestamps = pd.to_datetime(pings['timestamp'].astype(str), format=TIMESTAMP_FORMAT, errors='coerce')
+        pings = pings.assign(timestamp=timestamps).dropna(subset=['timestamp', 'latitude', 'longitude'])
+
+        codes, self.trailer_ids = pd.factorize(pings['trailer_id'], sort=True)
+        seconds = pings['timestamp'].to_numpy().astype('datetime64[s]').astype(np.int64)
+        order = np.lexsort((seconds, codes))
+        self.codes = codes[order]
+        self.seconds = seconds[order]
+        self.lat = pings['latitude'].to_numpy(dtype=float)[order]
+        self.lon = pings['longitude'].to_numpy(dtype=float)[order]
+
+        # Pings of trailer k are rows offsets[k] to offsets[k + 1]
+        self.offsets = np.searchsorted(self.codes, np.arange(len(self.trailer_ids) + 1))
+        self.start = int(self.seconds.min()) if len(self.seconds) else 0
+        self.end = int(self.seconds.max()) if len(self.seconds) else 0
+        # Band width per trailer, wider than the whole time range
+        self._band = self.end - self.start + 1
+        self._keys = self.codes * self._band + (self.seconds - self.start)
+
+    def interpolate(self, seconds):
+        """Latitude and longitude of every trailer at each time (epoch seconds)
+
+        Returns two (len(seconds), trailers) arrays, positions between two
+        pings are interpolated linearly. A trailer has NaN before its first
+        and after its last ping.
+        """
+        seconds = np.atleast_1d(np.asarray(seconds, dtype=np.int64))
+        trailers = np.arange(len(self.trailer_ids))
+        first, last = self.offsets[:-1], self.offsets[1:] - 1
+        # Clipping keeps times outside the range from landing in a neighbouring trailer's band
+        offset = np.clip(seconds - self.start, -1, self._band)[:, None]
+        after = np.searchsorted(self._keys, trailers * self._band + offset, side='right')
+        before = np.maximum(after - 1, first)
+        after = np.minimum(after, last)
+
+        t0, t1 = self.seconds[before], self.seconds[after]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(t1 > t0, (seconds[:, None] - t0) / (t1 - t0), 0.0)
+        lat = self.lat[before] + (self.lat[after] - self.lat[before]) * weight
+        lon = self.lon[before] + (self.lon[after] - self.lon[before]) * weight
+
+        outside = (seconds[:, None] < self.seconds[first]) | (seconds[:, None] > self.seconds[last])
+        lat[outside] = np.nan
+        lon[outside] = np.nan
+        return lat, lon
+
+    def positions_at(self, time):
+        """Where every trailer was at time, NaN for trailers without pings around it"""
+        lat, lon = self.interpolate(pd.Timestamp(time).value // 10 ** 9)
+        return pd.DataFrame({
+            'trailer_id': self.trailer_ids,
+            'latitude': lat[0],
+            'longitude': lon[0]
+        })
+
+    def frames(self, start, end, step):
+        """Epoch seconds from start to end (timestamps) every step seconds"""
+        return np.arange(pd.Timestamp(start).value // 10 ** 9, pd.Timestamp(end).value // 10 ** 9 + 1, step)
@@ -0,0 +1,67 @@
+"""Length-weighted road composition of routes
+
+Every step of an attributed route (see road_enrichment) carries the
+attributes of the segment that starts at it, so each step is weighted by the
+length of that segment instead of counting once. A route's composition is a
+small histogram, the distance per value of each attribute, which is all the
+fleet-wide aggregates need.
+"""
+import numpy as np
+import pandas as pd
+
+from geometry import haversine
+from road_enrichment import UNKNOWN
+
+COMPOSITION_COLUMNS = ['road_type', 'surface', 'speed_limit']
+
+
+def step_lengths(route_df):
+    """Length in meters of the segment starting at each step, zero for the last step"""
+    lat = route_df['LAT'].to_numpy(dtype=float)
+    lon = route_df['LONG'].to_numpy(dtype=float)
+    return np.append(haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]), 0.0)
+
+
+def _with_shares(composition):
+    total = composition.groupby('attribute', sort=False)['distance'].transform('sum')
+    composition['share'] = (composition['distance'] / total.where(total > 0)).fillna(0.0)
+    return composition
+
+
+def route_composition(route_df, columns=COMPOSITION_COLUMNS):
+    """Distance (meters) and share of the route per value of each attribute
+
+    One row per attribute and value, largest distance first within an
+    attribute. Missing values count as UNKNOWN.
+    """
+    values = route_df[columns].astype(object).fillna(UNKNOWN).astype(str)
+    steps = values.assign(distance=step_lengths(route_df)).melt(
+        id_vars='distance', var_name='attribute', value_name='value'
+    )
+    composition = steps.groupby(['attribute', 'value'], sort=False, as_index=False)['distance'].sum()
+    composition = composition.sort_values(['attribute', 'distance'], ascending=[True, False], kind='stable')
+    return _with_shares(composition.reset_index(drop=True))
+
+
+def _stack(compositions):
+    return pd.concat(compositions, names=['route_id', None]).reset_index(level=0)
+
+
+def fleet_composition(compositions):
+    """Composition of all routes together, from a dict of route_id to route_composition"""
+    table = _stack(compositions)
+    composition = table.groupby(['attribute', 'value'], sort=False, as_index=False)['distance'].sum()
+    composition = composition.sort_values(['attribute', 'distance'], ascending=[True, False], kind='stable')
+    return _with_shares(composition.reset_index(drop=True))
+
+
+def composition_matrix(compositions, attribute='road_type'):
+    """Share of each route's distance per value of one attribute, a row per route
+
+    Columns are ordered by fleet-wide distance, values a route doesn't have are 0.
+    """
+    table = _stack(compositions)
+    table = table[table['attribute'] == attribute]
+    order = table.groupby('value', sort=False)['distance'].sum().sort_values(ascending=False).index
+    matrix = table.pivot_table(index='route_id', columns='value', values='share', aggfunc='sum', fill_value=0.0)
+    return matrix.reindex(index=list(compositions), columns=order, fill_value=0.0).rename_axis(columns=None)
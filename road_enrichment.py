@@ -0,0 +1,69 @@
+"""Road attributes for any route, joined from attributed road traces
+
+Traces like 945_road_type.csv carry per-step road attributes (road type, speed
+limit, lanes, surface, county, ...). All their segments go into one spatial
+index, and every segment of a route geometry takes the attributes of the
+nearest attributed segment, so a route needs no exported trace of its own.
+"""
+import numpy as np
+import pandas as pd
+
+from geometry import RouteIndex
+from map_matching import RouteMatcher
+
+TRACE_COLUMNS = ['ID', 'STEP', 'LAT', 'LONG']
+# Route segments farther than this (meters) from every attributed segment stay unknown
+MAX_MATCH_DISTANCE = 30
+UNKNOWN = 'unknown'
+
+
+class RoadAttributeIndex:
+    """Spatial index over the segments of attributed road traces"""
+
+    def __init__(self, traces):
+        """traces has ID, STEP, LAT and LONG columns plus one column per attribute"""
+        traces = traces.sort_values(['ID', 'STEP'], kind='stable').reset_index(drop=True)
+        self.columns = [column for column in traces.columns if column not in TRACE_COLUMNS]
+        self.attributes = traces[self.columns].astype(object)
+
+        groups = traces.groupby('ID', sort=False)
+        self.trace_ids = list(groups.groups)
+        # Row of each trace's first step, segment i of a trace starts at step row + i
+        self._starts = {trace_id: int(group.index[0]) for trace_id, group in groups}
+        self.matcher = RouteMatcher({
+            trace_id: RouteIndex(group[['LAT', 'LONG']].to_numpy(dtype=float)) for trace_id, group in groups
+        })
+
+    def lookup(self, lat, lon, max_distance=MAX_MATCH_DISTANCE):
+        """Attributes of the nearest attributed segment for each point, UNKNOWN beyond max_distance"""
+        snapped = self.matcher.snap(lat, lon, max_distance=max_distance)
+        matched = snapped['route_id'].notna().to_numpy()
+        rows = np.zeros(len(snapped), dtype=int)
+        rows[matched] = snapped['route_id'][matched].map(self._starts).to_numpy(dtype=int) \
+            + snapped['segment'][matched].to_numpy(dtype=int)
+        attributes = self.attributes.iloc[rows].reset_index(drop=True)
+        attributes[~matched] = UNKNOWN
+        return attributes
+
+
+def enrich_route(index, route_id, latlon, max_distance=MAX_MATCH_DISTANCE):
+    """Per-step road attributes along a route geometry, shaped like an attributed trace
+
+    Each step takes the attributes of the segment that starts at it, looked up
+    at the segment midpoint so steps on shared vertices aren't attributed to
+    the neighbouring segment. The last step repeats the one before it.
+    """
+    latlon = np.asarray(latlon, dtype=float)
+    if len(latlon) > 1:
+        midpoints = (latlon[:-1] + latlon[1:]) / 2
+        midpoints = np.vstack([midpoints, midpoints[-1:]])
+    else:
+        midpoints = latlon
+    attributes = index.lookup(midpoints[:, 0], midpoints[:, 1], max_distance)
+    steps = pd.DataFrame({
+        'ID': route_id,
+        'STEP': np.arange(1, len(latlon) + 1),
+        'LAT': latlon[:, 0],
+        'LONG': latlon[:, 1]
+    })
+    return pd.concat([steps, attributes], axis=1)
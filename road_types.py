@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+SEGMENT_COLUMNS = ['road_type', 'name', 'speed_limit', 'lanes_total', 'surface']
+
+
+def build_segments(route_df):
+    """Group consecutive steps with the same road type into a segment table
+
+    Returns one row per segment with the attributes of its first step, the
+    step range it covers and an (n, 2) [lat, lon] array of its coordinates.
+    """
+    road_type = route_df['road_type']
+    starts = np.flatnonzero(road_type.ne(road_type.shift()).to_numpy())
+    ends = np.append(starts[1:], len(route_df))
+
+    latlon = route_df[['LAT', 'LONG']].to_numpy(dtype=float)
+
+    segments = route_df.iloc[starts][SEGMENT_COLUMNS].reset_index(drop=True)
+    segments['start'] = starts
+    segments['end'] = ends
+    segments['coordinates'] = pd.Series([latlon[s:e] for s, e in zip(starts, ends)], dtype=object)
+    return segments
@@ -0,0 +1,147 @@
+"""Compact on-disk copies of the bundled route data
+
+Run ``python route_store.py`` to convert the ORS GeoJSON routes into .npy
+coordinate and step arrays, index them in a small geometry catalog and convert
+the CSV tables into Parquet. The loaders below use the converted files when they
+are present and newer than their source, and fall back to parsing the original
+files otherwise.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from geometry import to_latlon
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(DATA_DIR, 'columnar')
+
+CATALOG_PATH = os.path.join(STORE_DIR, 'geometries.parquet')
+
+TABLE_FILES = ['1routes.csv', '1routes_vehicles_status.csv']
+# Attributed road traces, every file matching this adds to the road attribute index
+ROAD_TRACE_PATTERN = os.path.join(DATA_DIR, '*_road_type.csv')
+
+
+def _is_fresh(path, source_path):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+
+def geometry_files():
+    """Route geometry files bundled with the app"""
+    return sorted(os.path.basename(path) for path in glob.glob(os.path.join(DATA_DIR, '*.geojson')))
+
+
+def road_trace_files():
+    """Attributed road trace tables bundled with the app"""
+    return sorted(glob.glob(ROAD_TRACE_PATTERN))
+
+
+def route_array_path(filename):
+    name = os.path.splitext(filename)[0]
+    return os.path.join(STORE_DIR, f'{name}.npy')
+
+
+def route_steps_path(filename):
+    name = os.path.splitext(filename)[0]
+    return os.path.join(STORE_DIR, f'{name}.steps.npy')
+
+
+def table_path(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(STORE_DIR, f'{name}.parquet')
+
+
+def read_geojson_latlon(path):
+    with open(path, 'r') as f:
+        geojson = json.load(f)
+    return to_latlon(geojson['features'][0]['geometry']['coordinates'])
+
+
+def read_geojson_steps(path):
+    """ORS route steps as an (n, 4) array: first and last way point index, distance (m), duration (s)"""
+    with open(path, 'r') as f:
+        geojson = json.load(f)
+    segments = geojson['features'][0]['properties'].get('segments', [])
+    steps = [step for segment in segments for step in segment['steps']]
+    return np.array(
+        [[step['way_points'][0], step['way_points'][1], step['distance'], step['duration']] for step in steps],
+        dtype=float
+    ).reshape(-1, 4)
+
+
+def _catalog_entry(filename):
+    with open(os.path.join(DATA_DIR, filename), 'r') as f:
+        geojson = json.load(f)
+    coordinates = geojson['features'][0]['geometry']['coordinates']
+    # The ORS query holds the requested origin and destination, fall back to the line ends
+    waypoints = geojson.get('metadata', {}).get('query', {}).get('coordinates') or coordinates
+    min_lon, min_lat, max_lon, max_lat = geojson.get('bbox') or geojson['features'][0]['bbox']
+    return {
+        'file': filename,
+        'origin_latitude': waypoints[0][1],
+        'origin_longitude': waypoints[0][0],
+        'destination_latitude': waypoints[-1][1],
+        'destination_longitude': waypoints[-1][0],
+        'min_lat': min_lat,
+        'min_lon': min_lon,
+        'max_lat': max_lat,
+        'max_lon': max_lon
+    }
+
+
+def build_geometry_catalog():
+    return pd.DataFrame([_catalog_entry(filename) for filename in geometry_files()])
+
+
+def read_geometry_catalog():
+    """One row per geometry file with its endpoints and bounding box"""
+    files = geometry_files()
+    if os.path.exists(CATALOG_PATH):
+        catalog = pd.read_parquet(CATALOG_PATH)
+        if sorted(catalog['file']) == files and all(_is_fresh(CATALOG_PATH, os.path.join(DATA_DIR, f)) for f in files):
+            return catalog
+    return build_geometry_catalog()
+
+
+def load_route_latlon(filename):
+    """[lat, lon] array of a route geometry, memory-mapped from the converted file when available"""
+    source = os.path.join(DATA_DIR, filename)
+    path = route_array_path(filename)
+    if _is_fresh(path, source):
+        return np.load(path, mmap_mode='r')
+    return read_geojson_latlon(source)
+
+
+def load_route_steps(filename):
+    """ORS steps of a route geometry, from the converted file when available"""
+    source = os.path.join(DATA_DIR, filename)
+    path = route_steps_path(filename)
+    if _is_fresh(path, source):
+        return np.load(path)
+    return read_geojson_steps(source)
+
+
+def read_table(csv_path):
+    """Read a bundled CSV table, from its Parquet copy when available"""
+    path = table_path(csv_path)
+    if _is_fresh(path, csv_path):
+        return pd.read_parquet(path)
+    return pd.read_csv(csv_path)
+
+
+def convert_all():
+    os.makedirs(STORE_DIR, exist_ok=True)
+    for filename in geometry_files():
+        latlon = read_geojson_latlon(os.path.join(DATA_DIR, filename))
+        np.save(route_array_path(filename), latlon)
+        np.save(route_steps_path(filename), read_geojson_steps(os.path.join(DATA_DIR, filename)))
+    build_geometry_catalog().to_parquet(CATALOG_PATH, index=False)
+    for csv_path in [os.path.join(DATA_DIR, filename) for filename in TABLE_FILES] + road_trace_files():
+        pd.read_csv(csv_path).to_parquet(table_path(csv_path), index=False)
+
+
+if __name__ == '__main__':
+    convert_all()
@@ -0,0 +1,19 @@
+STOP_TYPES = ['gas', 'sleep', 'break']
+
+
+def build_route_summary(routes_df):
+    """One row per route: its first row in routes_df plus duration totals, indexed by route_id"""
+    summary = routes_df.drop_duplicates('route_id').set_index('route_id')
+    durations = routes_df.groupby('route_id', sort=False)['duration']
+    drive = routes_df['stop_type'] == 'drive'
+
+    summary['total_duration'] = durations.sum()
+    summary['drive_time'] = routes_df[drive].groupby('route_id')['duration'].sum().reindex(summary.index, fill_value=0)
+    summary['pause_time'] = summary['total_duration'] - summary['drive_time']
+    return summary
+
+
+def group_stops(routes_df, stop_types=STOP_TYPES):
+    """Stop rows of every route as lists of records, keyed by route_id"""
+    stops = routes_df[routes_df['stop_type'].isin(stop_types)]
+    return {route_id: group.to_dict('records') for route_id, group in stops.groupby('route_id', sort=False)}
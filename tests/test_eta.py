@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from core import route_status
+from eta import EtaIndex
+from geometry import RouteIndex
+
+
+def test_step_time_spread_by_distance(straight_line):
+    index = RouteIndex(straight_line)
+    # One 1000 s step over the first half, one 500 s step over the second
+    steps = np.array([[0, 5, 0, 1000], [5, 10, 0, 500]], dtype=float)
+    eta = EtaIndex(index, steps)
+    assert eta.drive_time == pytest.approx(1500)
+    assert eta.remaining_drive_time(0.25) == pytest.approx(1000)
+    assert eta.remaining_drive_time(0.5) == pytest.approx(500)
+    assert eta.remaining_drive_time(1.0) == pytest.approx(0)
+
+
+def test_empty_step_adds_time_where_it_starts(straight_line):
+    index = RouteIndex(straight_line)
+    steps = np.array([[0, 10, 0, 1000], [5, 5, 0, 300]], dtype=float)
+    eta = EtaIndex(index, steps)
+    assert eta.drive_time == pytest.approx(1300)
+    assert eta.remaining_drive_time(0.45) == pytest.approx(550 + 300)
+    # All of it is behind once the segment starting there is driven
+    assert eta.remaining_drive_time(0.6) == pytest.approx(400)
+
+
+def test_stops_count_until_passed(straight_line):
+    index = RouteIndex(straight_line)
+    steps = np.array([[0, 10, 0, 600]], dtype=float)
+    # 30 minute stop halfway, 10 minute stop at the end
+    eta = EtaIndex(index, steps, [(0, 0.05, 30), (0, 0.1, 10)])
+    assert eta.stop_time == pytest.approx(2400)
+    np.testing.assert_allclose(eta.remaining_time([0.0, 0.5, 0.75, 1.0]), [50, 45, 12.5, 10])
+
+
+def test_progress_outside_the_route_is_clipped(straight_line):
+    index = RouteIndex(straight_line)
+    eta = EtaIndex(index, np.array([[0, 10, 0, 600]], dtype=float))
+    np.testing.assert_allclose(eta.remaining_time([-1.0, 2.0]), [10, 0])
+
+
+def test_route_status_distances_share_one_source(straight_line):
+    index = RouteIndex(straight_line)
+    eta = EtaIndex(index, np.array([[0, 10, 0, 3600]], dtype=float))
+    status = route_status(index, eta, 0.0)
+    assert status['remaining_distance'] == pytest.approx(status['total_distance'])
+    assert route_status(index, eta, 0.25)['remaining_distance'] == pytest.approx(0.75 * status['total_distance'])
+
+
+def test_route_status_times_share_one_source(straight_line):
+    index = RouteIndex(straight_line)
+    eta = EtaIndex(index, np.array([[0, 10, 0, 3600]], dtype=float), [(0, 0.05, 30)])
+    status = route_status(index, eta, 0.0)
+    assert status['total_time'] == pytest.approx(status['drive_time'] + status['stop_time']) == pytest.approx(90)
+    assert status['remaining_time'] == pytest.approx(status['total_time'])
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from geometry import RouteIndex, haversine, lod_for_zoom, lod_level, simplify
+
+
+def test_cumulative_distance_matches_haversine(straight_line):
+    index = RouteIndex(straight_line)
+    assert index.total == pytest.approx(haversine(0, 0, 0, 0.1))
+    assert np.all(np.diff(index.cumdist) > 0)
+
+
+def test_split_at_distance_not_vertex_count():
+    # Dense vertices at the start, so half the vertices is far less than half the distance
+    latlon = np.column_stack([np.zeros(6), [0, 0.001, 0.002, 0.003, 0.004, 0.1]])
+    index = RouteIndex(latlon)
+    completed, remaining = index.split(0.5)
+    assert completed[-1] == remaining[0]
+    assert completed[-1] == pytest.approx([0, 0.05])
+    assert len(completed) == 6 and len(remaining) == 2
+
+
+@pytest.mark.parametrize('progress', [0.0, 1.0, -1.0, 2.0])
+def test_split_at_the_ends(progress, straight_line):
+    latlon = straight_line
+    completed, remaining = RouteIndex(latlon).split(progress)
+    if progress <= 0:
+        assert completed == [latlon[0].tolist(), latlon[0].tolist()]
+        assert remaining[1:] == latlon[1:].tolist()
+    else:
+        assert remaining[0] == pytest.approx(latlon[-1].tolist())
+        assert len(completed) == len(latlon) + 1
+
+
+def test_split_with_simplified_indices(straight_line):
+    latlon = straight_line
+    completed, remaining = RouteIndex(latlon).split(0.55, np.array([0, 5, 10]))
+    assert completed[:-1] == [latlon[0].tolist(), latlon[5].tolist()]
+    assert remaining[1:] == [latlon[10].tolist()]
+    assert completed[-1] == pytest.approx([0, 0.055])
+
+
+def test_simplify_drops_collinear_vertices(straight_line):
+    assert simplify(straight_line, 1e-6).tolist() == [0, 10]
+
+
+def test_simplify_keeps_corners_above_tolerance():
+    latlon = np.array([[0, 0], [0, 0.5], [0, 1], [0.5, 1], [1, 1]], dtype=float)
+    assert simplify(latlon, 0.01).tolist() == [0, 2, 4]
+    assert simplify(latlon, 0).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_simplify_short_lines_unchanged(straight_line):
+    assert simplify(straight_line[[0, -1]], 1.0).tolist() == [0, 1]
+
+
+def test_lod_for_zoom():
+    lods = {4: np.array([0, 10]), 8: np.array([0, 5, 10])}
+    assert lod_level(3, lods.keys()) == 4
+    assert lod_level(5, lods.keys()) == 8
+    assert lod_level(9, lods.keys()) is None
+    assert lod_for_zoom(lods, 6, 11).tolist() == [0, 5, 10]
+    assert len(lod_for_zoom(lods, 12, 11)) == 11
@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+
+from keboola_sync import KeboolaTableSource, MemoryTableSource, TableSync, edited_rows, merge_changes, write_batches
+
+
+def pings():
+    return pd.DataFrame({
+        'trailer_id': ['Trailer_1', 'Trailer_2', 'Trailer_3'],
+        'timestamp': ['2025-01-27 10:00:00', 'bad', '27/01/2025 10:00']
+    })
+
+
+def test_merge_changes_newer_rows_win():
+    merged = merge_changes(pings(), pings().iloc[[1]].assign(timestamp='2025-01-27 11:00:00'), ['trailer_id'])
+    assert merged['timestamp'].tolist() == ['2025-01-27 10:00:00', '27/01/2025 10:00', '2025-01-27 11:00:00']
+
+
+def test_table_sync_fetches_only_changes():
+    source = MemoryTableSource(pings(), primary_key=['trailer_id'])
+    sync = TableSync(source)
+    version, data = sync.sync()
+    assert version == 1 and len(data) == 3
+
+    # Nothing changed, same version and data
+    assert sync.sync() == (1, data)
+
+    source.write(pd.DataFrame({'trailer_id': ['Trailer_2', 'Trailer_4'], 'timestamp': ['2025-01-27 11:00:00'] * 2}))
+    version, data = sync.sync()
+    assert version == 2
+    assert data.set_index('trailer_id')['timestamp'].to_dict() == {
+        'Trailer_1': '2025-01-27 10:00:00',
+        'Trailer_3': '27/01/2025 10:00',
+        'Trailer_2': '2025-01-27 11:00:00',
+        'Trailer_4': '2025-01-27 11:00:00'
+    }
+
+
+def test_table_sync_ttl_and_force():
+    source = MemoryTableSource(pings(), primary_key=['trailer_id'])
+    sync = TableSync(source, ttl=3600)
+    sync.sync()
+    source.write(pings().iloc[[0]].assign(timestamp='2025-01-28 10:00:00'))
+    # Within the ttl the local copy is served without asking the source
+    assert sync.sync()[0] == 1
+    version, data = sync.sync(force=True)
+    assert version == 2
+    assert data.loc[data['trailer_id'] == 'Trailer_1', 'timestamp'].item() == '2025-01-28 10:00:00'
+
+
+def test_edited_rows_only_real_changes():
+    df = pings()
+    edits = {
+        '1': {'timestamp': '2025-01-27 12:00:00'},
+        # Set back to the original value
+        '0': {'timestamp': '2025-01-27 10:00:00'},
+        # Left over from an older, longer table
+        '7': {'timestamp': '2025-01-27 13:00:00'}
+    }
+    changed = edited_rows(df, edits, ['trailer_id'])
+    assert changed.to_dict('records') == [{'trailer_id': 'Trailer_2', 'timestamp': '2025-01-27 12:00:00'}]
+    # The displayed table is left as it was
+    assert df['timestamp'].tolist() == pings()['timestamp'].tolist()
+
+
+def test_edited_rows_without_edits():
+    assert len(edited_rows(pings(), {})) == 0
+
+
+def test_write_batches_retries_failed_chunks(monkeypatch):
+    monkeypatch.setattr('keboola_sync.time.sleep', lambda seconds: None)
+    rows = pd.DataFrame({'value': range(5)})
+    written, failures, progress = [], [1], []
+
+    def write(chunk):
+        if len(written) == 1 and failures:
+            failures.pop()
+            raise ConnectionError('dropped')
+        written.append(chunk['value'].tolist())
+
+    total = write_batches(write, rows, batch_size=2, progress=lambda done, total: progress.append((done, total)))
+    assert total == 5
+    assert written == [[0, 1], [2, 3], [4]]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+
+
+def test_write_batches_raises_after_retries(monkeypatch):
+    monkeypatch.setattr('keboola_sync.time.sleep', lambda seconds: None)
+
+    def write(chunk):
+        raise ConnectionError('down')
+
+    with pytest.raises(ConnectionError):
+        write_batches(write, pd.DataFrame({'value': range(3)}), retries=2)
+
+
+def test_keboola_source_write_is_a_plain_incremental_load():
+    source = KeboolaTableSource('https://connection.keboola.com', 'token', 'in.c-fleet.pings')
+    loads = []
+
+    class Tables:
+        def load(self, table_id, file_path, is_incremental=False):
+            loads.append((table_id, pd.read_csv(file_path), is_incremental))
+
+    source.client.tables = Tables()
+    source.write(pings())
+    table_id, rows, is_incremental = loads[0]
+    assert (table_id, is_incremental) == ('in.c-fleet.pings', True)
+    pd.testing.assert_frame_equal(rows, pings())
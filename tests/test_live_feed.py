@@ -0,0 +1,49 @@
+from live_feed import FileTailSource, LivePositions
+
+
+def test_changes_since_only_moved_vehicles():
+    positions = LivePositions()
+    positions.update([('V1', 1.0, 2.0, '2025-01-27 10:00:00'), ('V2', 3.0, 4.0, '2025-01-27 10:00:00')])
+    seq, moved = positions.changes_since(0)
+    assert seq == 1 and set(moved) == {'V1', 'V2'}
+
+    positions.update([
+        ('V1', 1.5, 2.5, '2025-01-27 10:05:00'),
+        # Older than the known position
+        ('V2', 9.0, 9.0, '2025-01-27 09:00:00'),
+        ('V3', 5.0, 6.0, 'not a time')
+    ])
+    seq, moved = positions.changes_since(seq)
+    assert seq == 2
+    assert moved == {'V1': (1.5, 2.5, '2025-01-27 10:05:00')}
+    assert positions.changes_since(seq) == (2, {})
+
+
+def test_changes_since_before_the_log_gets_everything():
+    positions = LivePositions()
+    positions.update([('V1', 1.0, 2.0, '2025-01-27 10:00:00')])
+    positions.update([('V2', 3.0, 4.0, '2025-01-27 10:00:00')])
+    seq, moved = positions.changes_since(-1)
+    assert seq == 2 and set(moved) == {'V1', 'V2'}
+
+
+def test_file_tail_reads_appended_lines(tmp_path):
+    path = tmp_path / 'pings.csv'
+    source = FileTailSource(str(path))
+    assert source.read() == []
+
+    path.write_text('trailer_id,latitude,longitude,timestamp\nT1,1.0,2.0,2025-01-27 10:00:00\nT2,3.0,')
+    assert source.read() == [('T1', 1.0, 2.0, '2025-01-27 10:00:00')]
+
+    # The partial line is read once it is complete, malformed lines are skipped
+    with open(path, 'a') as f:
+        f.write('4.0,2025-01-27 10:00:00\nT3,north,5.0,2025-01-27 10:00:00\n')
+    assert source.read() == [('T2', 3.0, 4.0, '2025-01-27 10:00:00')]
+
+
+def test_update_compares_times_not_strings():
+    positions = LivePositions()
+    positions.update([('V1', 1.0, 2.0, '2025-01-09 23:00:00')])
+    # Sorts before the known timestamp as a string, but is a day later
+    assert positions.update([('V1', 1.5, 2.5, '2025-1-10 01:00:00')]) == {'V1'}
+    assert positions.update([('V1', 9.0, 9.0, '2025-01-10 00:00:00')]) == set()
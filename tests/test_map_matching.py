@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from geometry import RouteIndex
+from map_matching import RouteMatcher, live_route_progress
+
+
+def east_west(lat, n=11):
+    # A line along a parallel, 0.01 degrees of longitude between vertices
+    return RouteIndex(np.column_stack([np.full(n, lat), np.linspace(-90, -89.9, n)]))
+
+
+def test_snap_to_nearest_route():
+    matcher = RouteMatcher({'NORTH': east_west(40.0), 'SOUTH': east_west(39.0)})
+    snapped = matcher.snap([40.001, 38.999], [-89.945, -89.925])
+    assert snapped['route_id'].tolist() == ['NORTH', 'SOUTH']
+    assert snapped['segment'].tolist() == [5, 7]
+    assert snapped['latitude'].tolist() == pytest.approx([40.0, 39.0])
+    assert snapped['longitude'].tolist() == pytest.approx([-89.945, -89.925])
+    assert snapped['progress'].tolist() == pytest.approx([0.55, 0.75], abs=1e-3)
+    assert snapped['distance'].tolist() == pytest.approx([111.2, 111.2], rel=0.01)
+
+
+def test_snap_beyond_max_distance():
+    matcher = RouteMatcher({'NORTH': east_west(40.0)})
+    snapped = matcher.snap([40.0, 41.0], [-89.95, -89.95], max_distance=1000)
+    assert snapped['route_id'].notna().tolist() == [True, False]
+
+
+def test_snap_nothing():
+    assert len(RouteMatcher({'NORTH': east_west(40.0)}).snap([], [])) == 0
+
+
+def test_live_progress_keeps_trailers_on_their_own_route():
+    # Two routes over the same highway, one driven each way
+    routes = {'EAST': east_west(40.0), 'WEST': RouteIndex(east_west(40.0).latlon[::-1].copy())}
+    matchers = {route_id: RouteMatcher({route_id: index}) for route_id, index in routes.items()}
+    assignments = {'Trailer_1': 'EAST', 'Trailer_2': 'WEST'}
+    pings = pd.DataFrame({
+        'trailer_id': ['Trailer_1', 'Trailer_2', 'Trailer_1', 'Trailer_3'],
+        'latitude': [40.0, 40.0, 40.0, 40.0],
+        'longitude': [-89.99, -89.98, -89.92, -89.95],
+        'timestamp': ['2025-01-27 10:00:00', '2025-01-27 11:00:00', '2025-01-27 10:30:00', '2025-01-27 12:00:00']
+    })
+    progress = live_route_progress(pings, assignments.get, matchers.__getitem__, 1000)
+    # Trailer_3 has no route, Trailer_2's later ping doesn't move Trailer_1
+    assert progress == pytest.approx({'EAST': 0.8, 'WEST': 0.8}, abs=1e-3)
+
+
+def test_live_progress_without_pings():
+    assert live_route_progress(pd.DataFrame({'trailer_id': []}), {}.get, None, 1000) == {}
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from replay import TrackIndex
+
+
+def pings():
+    # Trailer_A pings from 10:00 to 12:00, Trailer_B only at 11:00, plus one unparseable row
+    return pd.DataFrame({
+        'trailer_id': ['Trailer_B', 'Trailer_A', 'Trailer_A', 'Trailer_A', 'Trailer_A'],
+        'latitude': [5.0, 2.0, 0.0, 1.0, 9.0],
+        'longitude': [5.0, 20.0, 0.0, 10.0, 90.0],
+        'timestamp': ['2025-01-31 11:00:00', '2025-01-31 12:00:00', '2025-01-31 10:00:00',
+                      '2025-01-31 11:00:00', 'bad'],
+    })
+
+
+def test_pings_sorted_per_trailer():
+    index = TrackIndex(pings())
+    assert list(index.trailer_ids) == ['Trailer_A', 'Trailer_B']
+    assert index.offsets.tolist() == [0, 3, 4]
+    assert index.lat.tolist() == [0.0, 1.0, 2.0, 5.0]
+    assert index.end - index.start == 7200
+
+
+def test_positions_interpolated_between_pings():
+    positions = TrackIndex(pings()).positions_at('2025-01-31 10:30:00')
+    assert positions['trailer_id'].tolist() == ['Trailer_A', 'Trailer_B']
+    assert positions.loc[0, ['latitude', 'longitude']].tolist() == [0.5, 5.0]
+    # Trailer_B has no ping before 10:30
+    assert positions.loc[1, ['latitude', 'longitude']].isna().all()
+
+
+def test_positions_at_a_ping_time_are_exact():
+    positions = TrackIndex(pings()).positions_at('2025-01-31 11:00:00')
+    assert positions[['latitude', 'longitude']].to_numpy().tolist() == [[1.0, 10.0], [5.0, 5.0]]
+
+
+def test_times_outside_the_range_stay_in_their_own_track():
+    index = TrackIndex(pings())
+    frames = index.frames('2025-01-31 09:00:00', '2025-01-31 13:00:00', 3600)
+    lat, lon = index.interpolate(frames)
+    assert lat.shape == (5, 2)
+    np.testing.assert_array_equal(lat[:, 0], [np.nan, 0.0, 1.0, 2.0, np.nan])
+    np.testing.assert_array_equal(lon[:, 1], [np.nan, np.nan, 5.0, np.nan, np.nan])
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from geometry import haversine
+from trip_analytics import analyze_pings, ping_segments
+
+
+def pings():
+    # Trailer_A along the equator: a dwell, a normal leg, a two hour gap and a jump no truck can make.
+    # Trailer_B is in two places at once, and one row has no usable timestamp
+    return pd.DataFrame({
+        'trailer_id': ['Trailer_A', 'Trailer_B', 'Trailer_A', 'Trailer_A', 'Trailer_B', 'Trailer_A', 'Trailer_A',
+                       'Trailer_B'],
+        'latitude': [0.0, 10.0, 0.0, 0.0, 10.0, 0.0, 0.0, 11.0],
+        'longitude': [0.5, 10.0, 0.0, 0.0005, 10.1, 0.6, 1.6, 11.0],
+        'timestamp': ['2025-01-31 11:00:00', '2025-01-31 10:00:00', '2025-01-31 10:00:00', '2025-01-31 10:30:00',
+                      '2025-01-31 10:00:00', '2025-01-31 13:00:00', '2025-01-31 13:05:00', 'bad']
+    })
+
+
+def test_segments_follow_each_trailer_in_time_order():
+    segments = ping_segments(pings())
+    assert segments['trailer_id'].tolist() == ['Trailer_A'] * 4 + ['Trailer_B']
+    assert segments['start_longitude'].tolist()[:4] == [0.0, 0.0005, 0.5, 0.6]
+    assert segments['duration'].tolist() == [1800, 1800, 7200, 300, 0]
+    assert segments['distance'].iloc[2] == pytest.approx(haversine(0, 0.5, 0, 0.6))
+
+
+def test_segment_flags():
+    segments = ping_segments(pings())
+    assert segments['is_dwell'].tolist() == [True, False, False, False, False]
+    assert segments['is_gap'].tolist() == [False, False, True, False, False]
+    assert segments['is_impossible'].tolist() == [False, False, False, True, True]
+    assert segments['speed_kmh'].iloc[1] == pytest.approx(haversine(0, 0.0005, 0, 0.5) / 1800 * 3.6)
+    # Moving without any time passing
+    assert np.isinf(segments['speed_kmh'].iloc[4])
+
+
+def test_summary_leaves_impossible_jumps_out_of_the_distance():
+    _, summary = analyze_pings(pings())
+    trailer = summary.loc['Trailer_A']
+    assert trailer['distance_km'] == pytest.approx(haversine(0, 0, 0, 0.6) / 1000)
+    assert trailer['dwell_hours'] == pytest.approx(0.5)
+    assert (trailer['gaps'], trailer['impossible_jumps']) == (1, 1)
+    assert summary.loc['Trailer_B', 'distance_km'] == 0
+
+
+def test_parallel_matches_serial():
+    serial_segments, serial_summary = analyze_pings(pings())
+    segments, summary = analyze_pings(pings(), workers=2, min_rows=0)
+    order = ['trailer_id', 'start_time']
+    pd.testing.assert_frame_equal(
+        segments.sort_values(order, ignore_index=True), serial_segments.sort_values(order, ignore_index=True)
+    )
+    pd.testing.assert_frame_equal(summary, serial_summary)
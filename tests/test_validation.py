@@ -0,0 +1,46 @@
+import pandas as pd
+
+from validation import repair_timestamps, valid_timestamp_mask
+
+
+def test_valid_timestamp_mask_in_chunks():
+    timestamps = ['2025-01-27 10:00:00', '27/01/2025 10:00', None, '2025-02-30 10:00:00', '2025-01-28 10:00:00']
+    assert valid_timestamp_mask(timestamps, chunk_size=2).tolist() == [True, False, False, False, True]
+
+
+def test_repairs_unambiguous_formats():
+    repairs = repair_timestamps(['2025-01-31T16:41:52', '31/01/2025 16:41', '05/05/2025 10:00', 'bad'])
+    assert repairs['repaired'].tolist()[:3] == ['2025-01-31 16:41:52', '2025-01-31 16:41:00', '2025-05-05 10:00:00']
+    assert pd.isna(repairs['repaired'].iloc[3])
+    assert repairs['status'].tolist() == ['repaired', 'repaired', 'repaired', 'unparseable']
+
+
+def test_ambiguous_value_follows_the_groups_unambiguous_format():
+    # Only 01/13 proves the trailer writes month/day, 05/05 and 06/06 read the same either way
+    timestamps = ['01/13/2025 10:00', '05/05/2025 10:00', '06/06/2025 10:00', '02/03/2025 10:00']
+    repairs = repair_timestamps(timestamps, groups=['Trailer_1'] * 4)
+    assert repairs['repaired'].tolist() == [
+        '2025-01-13 10:00:00', '2025-05-05 10:00:00', '2025-06-06 10:00:00', '2025-02-03 10:00:00'
+    ]
+    assert repairs['format'].iloc[3] == '%m/%d/%Y %H:%M'
+    assert (repairs['status'] == 'repaired').all()
+
+
+def test_groups_decide_separately():
+    timestamps = ['13/01/2025 10:00', '02/03/2025 10:00', '01/13/2025 10:00', '02/03/2025 10:00']
+    repairs = repair_timestamps(timestamps, groups=['Trailer_1', 'Trailer_1', 'Trailer_2', 'Trailer_2'])
+    assert repairs['repaired'].tolist()[1::2] == ['2025-03-02 10:00:00', '2025-02-03 10:00:00']
+
+
+def test_ambiguous_without_evidence_or_with_a_tie():
+    repairs = repair_timestamps(['02/03/2025 10:00'])
+    assert repairs['status'].tolist() == ['ambiguous']
+    assert repairs['repaired'].isna().all()
+
+    tie = repair_timestamps(['13/01/2025 10:00', '01/13/2025 10:00', '02/03/2025 10:00'])
+    assert tie['status'].tolist() == ['repaired', 'repaired', 'ambiguous']
+
+
+def test_keeps_the_index():
+    timestamps = pd.Series(['31/01/2025 16:41', 'bad'], index=[10, 20])
+    assert repair_timestamps(timestamps).index.tolist() == [10, 20]
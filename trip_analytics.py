@@ -0,0 +1,107 @@
+"""Vectorized trip analytics over raw GPS pings
+
+Pings are sorted per trailer and compared with the previous ping of the same
+trailer to get segment distance, implied speed, dwell (not moving) time and
+gaps in the data. Large tables are split by trailer and analyzed in a process
+pool.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from geometry import haversine
+from validation import TIMESTAMP_FORMAT
+
+# Implied speeds above this (km/h) are not physically possible for a truck
+MAX_SPEED_KMH = 200
+# Consecutive pings closer than this (meters) count as standing still
+DWELL_RADIUS_M = 200
+# Time between pings (seconds) above which the data counts as having a gap
+GAP_SECONDS = 3600
+# Below this many pings everything runs in the current process
+PARALLEL_MIN_ROWS = 2_000_000
+
+
+def ping_segments(pings, max_speed_kmh=MAX_SPEED_KMH, dwell_radius=DWELL_RADIUS_M, gap_seconds=GAP_SECONDS):
+    """One row per pair of consecutive pings of the same trailer
+
+    pings needs trailer_id, latitude, longitude and timestamp columns. Pings
+    with an unparseable timestamp or position are left out.
+    """
+    timestamps = pd.to_datetime(pings['timestamp'].astype(str), format=TIMESTAMP_FORMAT, errors='coerce')
+    pings = pings.assign(timestamp=timestamps).dropna(subset=['timestamp', 'latitude', 'longitude'])
+
+    codes, trailers = pd.factorize(pings['trailer_id'])
+    seconds = pings['timestamp'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    order = np.lexsort((seconds, codes))
+    codes, seconds = codes[order], seconds[order]
+    lat = pings['latitude'].to_numpy(dtype=float)[order]
+    lon = pings['longitude'].to_numpy(dtype=float)[order]
+
+    # Segment i goes from ping i to ping i + 1 when both belong to the same trailer
+    same = codes[1:] == codes[:-1]
+    start = np.flatnonzero(same)
+    end = start + 1
+
+    distance = haversine(lat[start], lon[start], lat[end], lon[end])
+    duration = (seconds[end] - seconds[start]).astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(duration > 0, distance / duration * 3.6, np.where(distance > 0, np.inf, 0.0))
+
+    return pd.DataFrame({
+        'trailer_id': trailers[codes[start]],
+        'start_time': pd.to_datetime(seconds[start], unit='s'),
+        'end_time': pd.to_datetime(seconds[end], unit='s'),
+        'start_latitude': lat[start],
+        'start_longitude': lon[start],
+        'end_latitude': lat[end],
+        'end_longitude': lon[end],
+        'distance': distance,
+        'duration': duration,
+        'speed_kmh': speed,
+        'is_dwell': distance < dwell_radius,
+        'is_gap': duration > gap_seconds,
+        'is_impossible': speed > max_speed_kmh
+    })
+
+
+def summarize_trips(segments):
+    """Per-trailer totals from ping_segments"""
+    segments = segments.assign(
+        dwell_time=segments['duration'].where(segments['is_dwell'], 0.0),
+        moving_distance=segments['distance'].where(~segments['is_impossible'], 0.0)
+    )
+    summary = segments.groupby('trailer_id').agg(
+        segments=('distance', 'size'),
+        first_seen=('start_time', 'min'),
+        last_seen=('end_time', 'max'),
+        distance_km=('moving_distance', 'sum'),
+        max_speed_kmh=('speed_kmh', 'max'),
+        dwell_hours=('dwell_time', 'sum'),
+        gaps=('is_gap', 'sum'),
+        impossible_jumps=('is_impossible', 'sum')
+    )
+    summary['distance_km'] /= 1000
+    summary['dwell_hours'] /= 3600
+    return summary
+
+
+def analyze_pings(pings, workers=None, min_rows=PARALLEL_MIN_ROWS):
+    """Segments and per-trailer summary of a ping table
+
+    Tables of at least min_rows pings are split into one partition per worker
+    by trailer and processed in parallel. Workers are spawned rather than
+    forked, forking the threads of a Streamlit server can deadlock the child.
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(pings) < min_rows or workers < 2:
+        segments = ping_segments(pings)
+    else:
+        codes, _ = pd.factorize(pings['trailer_id'])
+        partitions = [pings[codes % workers == i] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            segments = pd.concat(pool.map(ping_segments, partitions), ignore_index=True)
+    return segments, summarize_trips(segments)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+CHUNK_SIZE = 500_000
+
+
+def valid_timestamp_mask(timestamps, fmt=TIMESTAMP_FORMAT, chunk_size=CHUNK_SIZE):
+    """Boolean array telling which timestamps parse with the given format
+
+    Parsing is vectorized and done chunk by chunk to keep peak memory bounded
+    on large tables.
+    """
+    timestamps = pd.Series(timestamps, copy=False).astype(str)
+    mask = np.empty(len(timestamps), dtype=bool)
+    for start in range(0, len(timestamps), chunk_size):
+        chunk = timestamps.iloc[start:start + chunk_size]
+        parsed = pd.to_datetime(chunk, format=fmt, errors='coerce')
+        mask[start:start + chunk_size] = parsed.notna().to_numpy()
+    return mask
+
+
+# Formats tried when repairing timestamps, the most likely first
+CANDIDATE_FORMATS = [
+    TIMESTAMP_FORMAT,
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d %H:%M:%S',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%d.%m.%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M',
+]
+
+
+def repair_timestamps(timestamps, groups=None, formats=CANDIDATE_FORMATS, fmt=TIMESTAMP_FORMAT):
+    """Propose fmt-normalized values for timestamps written in other formats
+
+    Every candidate format is tried on the whole column. A value that parses
+    to one datetime, under one or several formats, is repaired directly. When
+    formats disagree (01/02/2025 as day/month or month/day), the dominant
+    format of the value's group (e.g. trailer) decides, judged by the
+    unambiguous values of that group. Returns a DataFrame aligned with
+    timestamps with repaired, format and status columns; status is
+    'repaired', 'ambiguous' or 'unparseable', and repaired and format are
+    missing where nothing was repaired.
+    """
+    timestamps = pd.Series(timestamps, copy=False)
+    text = timestamps.astype(str).str.strip()
+    parsed = np.column_stack([
+        pd.to_datetime(text, format=candidate, errors='coerce').to_numpy(dtype='datetime64[ns]')
+        for candidate in formats
+    ])
+    matched = ~np.isnat(parsed)
+    rows = np.arange(len(text))
+
+    # The best ranked matching format and whether all matching formats agree with it
+    first = matched.argmax(axis=1)
+    value = parsed[rows, first]
+    any_match = matched.any(axis=1)
+    agree = (~matched | (parsed == value[:, None])).all(axis=1)
+    resolved = any_match & agree
+
+    chosen = np.where(resolved, first, -1)
+    ambiguous = any_match & ~agree
+    if ambiguous.any():
+        # Per group, how often each format was the only one a value parsed with. Values several
+        # formats agree on (05/05/2025) say nothing about the group's format and don't vote
+        groups = pd.Series(0 if groups is None else np.asarray(groups), index=timestamps.index)
+        unambiguous = matched.sum(axis=1) == 1
+        counts = pd.crosstab(groups[unambiguous], first[unambiguous]).reindex(
+            index=groups[ambiguous].unique(), columns=range(len(formats)), fill_value=0)
+        ambiguous_rows = rows[ambiguous]
+        scores = counts.loc[groups[ambiguous]].to_numpy() * matched[ambiguous_rows]
+        best = scores.argmax(axis=1)
+        # A clear winner among the formats the value matches, ties stay ambiguous
+        top = np.sort(scores, axis=1)
+        use = (top[:, -1] > 0) & (top[:, -1] > top[:, -2])
+        chosen[ambiguous_rows[use]] = best[use]
+        value[ambiguous_rows[use]] = parsed[ambiguous_rows[use], best[use]]
+
+    repaired = chosen >= 0
+    status = np.where(repaired, 'repaired', np.where(any_match, 'ambiguous', 'unparseable'))
+    formatted = pd.Series(value, index=timestamps.index).dt.strftime(fmt)
+    return pd.DataFrame({
+        'repaired': formatted.where(repaired, None),
+        'format': pd.Series(np.asarray(formats, dtype=object)[np.maximum(chosen, 0)], index=timestamps.index).where(repaired, None),
+        'status': status
+    }, index=timestamps.index)